@@ -5,36 +5,268 @@ An implementation of Craig Reynolds's Boids simulation using Python and Matplotl
 """
 
 
+import os, time, json
+import multiprocessing
+from multiprocessing import shared_memory
 import argparse
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+# matplotlib is only imported in main() when the flock is shown, so
+# headless runs neither need it installed nor pay for importing it
 from scipy.spatial.distance import squareform, pdist
+from scipy.spatial import cKDTree
 from numpy.linalg import norm
+# Numba is optional: without it the fused rule kernel is unavailable and
+# the rules are applied with NumPy array operations only
+try:
+    import numba
+except ImportError:
+    numba = None
 
 # set width and height for the screen
 width, height = 640, 480
+# deltaR provides a slight buffer which allows the boid to move 
+# slightly outside the window before it starts coming back from 
+# the opposite direction for better visual effect.
+deltaR = 2.0
+
+# largest number of candidate pairs gathered at once by gridPairs()
+maxCandidates = 1 << 22
+
+def gridPairs(pos, radius):
+    """all pairs of boids closer than radius, using a uniform grid of cells"""
+    # Put every boid in a square cell of side radius. Two boids closer than
+    # radius are then in the same cell or in neighboring cells, so only the
+    # boids in the 3x3 block of cells around each boid need a distance
+    # check, instead of all N of them.
+    # returns the directed pairs (i, j), i != j, and pos[i] - pos[j]
+    N = len(pos)
+    if N == 0:
+        return np.zeros(0, int), np.zeros(0, int), np.zeros((0, 2), pos.dtype)
+    cell = np.floor(pos/radius).astype(np.int64)
+    # shift cells so that every cell and its neighbors have index >= 0
+    cell -= cell.min(axis=0) - 1
+    ny = cell[:, 1].max() + 2
+    key = cell[:, 0]*ny + cell[:, 1]
+    # sort the boids by cell; each cell is then a run in the sorted order
+    order = np.argsort(key, kind='stable')
+    sortedKeys = key[order]
+    # for each boid, the run of boids in each of the 9 cells around it
+    offsets = [dx*ny + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+    lo = [np.searchsorted(sortedKeys, key + offset, 'left') for offset in offsets]
+    hi = [np.searchsorted(sortedKeys, key + offset, 'right') for offset in offsets]
+    # go through the boids in chunks so the candidate pairs fit in memory
+    candidates = np.cumsum(sum(h - l for l, h in zip(lo, hi)))
+    pairs = []
+    start = 0
+    while start < N:
+        done = candidates[start - 1] if start > 0 else 0
+        stop = max(start + 1, int(np.searchsorted(candidates, done + maxCandidates, 'right')))
+        for l, h in zip(lo, hi):
+            counts = h[start:stop] - l[start:stop]
+            # boid i paired with every boid in the neighboring cell
+            i = np.repeat(np.arange(start, stop), counts)
+            firsts = np.repeat(l[start:stop] - (np.cumsum(counts) - counts), counts)
+            j = order[np.arange(len(i)) + firsts]
+            delta = pos[i] - pos[j]
+            keep = (norm(delta, axis=1) < radius) & (i != j)
+            pairs.append((i[keep], j[keep], delta[keep]))
+        start = stop
+    if not pairs:
+        return np.zeros(0, int), np.zeros(0, int), np.zeros((0, 2))
+    return tuple(np.concatenate(p) for p in zip(*pairs))
+
+def kdtreePairs(pos, radius):
+    """all pairs of boids closer than radius, on the wrapped-around window"""
+    # applyBC() makes the world a torus: a boid leaving at width + deltaR
+    # comes back at -deltaR. cKDTree measures distances on a periodic box
+    # of that size, so flocks stay together across the edges.
+    # returns the directed pairs (i, j), i != j, and pos[i] - pos[j] taken
+    # the short way around
+    box = np.array([width + 2*deltaR, height + 2*deltaR])
+    shifted = np.mod(pos + deltaR, box)
+    # np.mod can round a tiny negative up to the box size itself
+    shifted[shifted >= box] = 0.0
+    tree = cKDTree(shifted, boxsize=box)
+    pairs = tree.query_pairs(radius, output_type='ndarray')
+    i, j = pairs[:, 0], pairs[:, 1]
+    delta = pos[i] - pos[j]
+    delta -= box*np.round(delta/box)
+    keep = norm(delta, axis=1) < radius
+    i, j, delta = i[keep], j[keep], delta[keep]
+    # query_pairs gives each pair once, with i < j
+    return (np.concatenate((i, j)), np.concatenate((j, i)),
+            np.concatenate((delta, -delta)))
+
+def sumPairs(i, values, N):
+    """sum of values over the pairs, for each first boid i of a pair"""
+    # the product of the sparse N x N matrix of pairs with values, done as
+    # a weighted count of each i. bincount always sums in float64; the
+    # result is handed back in the precision of values.
+    return np.stack([np.bincount(i, weights=values[:, 0], minlength=N),
+                     np.bincount(i, weights=values[:, 1], minlength=N)],
+                    axis=1).astype(values.dtype, copy=False)
+
+def fusedRules(i, j, delta, pos, vel, minDist, maxRuleVel, sep, align, coh, out):
+    """the three rules of applyRulesPairs() in one pass over the pairs"""
+    # applyRulesPairs() reads the pair arrays once per rule and builds a
+    # temporary array for every intermediate result. Here each pair is
+    # read once and added to the three sums straight away, into scratch
+    # arrays that live across ticks, and out gets the limited total.
+    # Compiled with Numba as fusedKernel; the sums are taken in the same
+    # order as sumPairs(), so both agree to rounding.
+    N = len(pos)
+    for a in range(N):
+        sep[a, 0] = 0.0
+        sep[a, 1] = 0.0
+        # D.dot(self.vel) includes each boid itself
+        align[a, 0] = vel[a, 0]
+        align[a, 1] = vel[a, 1]
+        coh[a, 0] = 0.0
+        coh[a, 1] = 0.0
+    for k in range(len(i)):
+        a = i[k]
+        dx = delta[k, 0]
+        dy = delta[k, 1]
+        if math.sqrt(dx*dx + dy*dy) < minDist:
+            sep[a, 0] += dx
+            sep[a, 1] += dy
+        align[a, 0] += vel[j[k], 0]
+        align[a, 1] += vel[j[k], 1]
+        coh[a, 0] += pos[a, 0] - dx
+        coh[a, 1] += pos[a, 1] - dy
+    # limit each rule as limit() does, then add them up
+    for a in range(N):
+        out[a, 0] = 0.0
+        out[a, 1] = 0.0
+        for rule in (sep, align, coh):
+            x = rule[a, 0]
+            y = rule[a, 1]
+            mag = math.sqrt(x*x + y*y)
+            if mag > maxRuleVel:
+                x = x*maxRuleVel/mag
+                y = y*maxRuleVel/mag
+            out[a, 0] += x
+            out[a, 1] += y
+
+fusedKernel = numba.njit(cache=True)(fusedRules) if numba is not None else None
+
+class ForceField:
+    """circular obstacles, point attractors and repulsors, and wind"""
+    # Obstacles are (x, y, R): a boid within R of the center is pushed
+    # away from it, harder the closer it gets. Points are (x, y, R, s): a
+    # boid within R is pulled towards the point with strength s, or pushed
+    # away if s < 0, so food is an attractor and a predator a repulsor.
+    # Obstacles and points are each kept in a k-d tree. Every tick the
+    # boids are put in a k-d tree too, and the boid-obstacle pairs within
+    # reach come out of one tree-to-tree query, so the cost grows with the
+    # number of pairs, not with boids x obstacles. The pushes of all pairs
+    # are then summed per boid with sumPairs(), as for the flocking rules.
+    def __init__(self, obstacleStrength=0.5, wind=(0.0, 0.0)):
+        self.obstacles = np.zeros((0, 3))
+        self.points = np.zeros((0, 4))
+        # push on a boid at the center of an obstacle
+        self.obstacleStrength = obstacleStrength
+        # velocity change added to every boid every tick
+        self.wind = np.array(wind, dtype=float)
+        # trees of the obstacle and point centers, built when first needed
+        self.obstacleTree = None
+        self.pointTree = None
+
+    def addObstacles(self, obstacles):
+        """add (x, y, R) obstacles, one per row"""
+        obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 3)
+        self.obstacles = np.concatenate((self.obstacles, obstacles))
+        self.obstacleTree = None
+
+    def addPoints(self, points):
+        """add (x, y, R, strength) attractors (strength > 0) and repulsors
+        (strength < 0), one per row"""
+        points = np.asarray(points, dtype=float).reshape(-1, 4)
+        self.points = np.concatenate((self.points, points))
+        self.pointTree = None
+
+    def build(self):
+        """build the trees of the obstacles and points that changed"""
+        if self.obstacleTree is None and len(self.obstacles):
+            self.obstacleTree = cKDTree(self.obstacles[:, :2])
+        if self.pointTree is None and len(self.points):
+            self.pointTree = cKDTree(self.points[:, :2])
+
+    def _near(self, boidTree, tree, centers, radii):
+        """(boid, center) pairs closer than the center's radius, with the
+        unit vectors from the centers to the boids and the distances"""
+        # query with the largest radius, then keep the pairs that are
+        # within their own center's radius
+        pairs = boidTree.sparse_distance_matrix(tree, radii.max(),
+                                                output_type='ndarray')
+        i, j, dist = pairs['i'], pairs['j'], pairs['v']
+        keep = dist < radii[j]
+        i, j, dist = i[keep], j[keep], dist[keep]
+        away = boidTree.data[i] - centers[j]
+        # a boid right on a center is pushed along x
+        away[dist == 0] = (1.0, 0.0)
+        dist[dist == 0] = 1.0
+        return i, j, away/dist.reshape(-1, 1), dist
+
+    def apply(self, pos):
+        """velocity changes of the boids at pos from all the fields"""
+        dv = np.zeros(pos.shape)
+        dv += self.wind
+        if not len(self.obstacles) and not len(self.points):
+            return dv
+        self.build()
+        boidTree = cKDTree(pos)
+        if self.obstacleTree is not None:
+            radii = self.obstacles[:, 2]
+            i, j, away, dist = self._near(boidTree, self.obstacleTree,
+                                          self.obstacles[:, :2], radii)
+            # from 0 at the edge of sight to obstacleStrength at the center
+            push = self.obstacleStrength*(1 - dist/radii[j])
+            dv += sumPairs(i, away*push.reshape(-1, 1), len(pos))
+        if self.pointTree is not None:
+            radii = self.points[:, 2]
+            i, j, away, dist = self._near(boidTree, self.pointTree,
+                                          self.points[:, :2], radii)
+            # attractors pull with their strength wherever in reach
+            pull = self.points[j, 3]
+            dv -= sumPairs(i, away*pull.reshape(-1, 1), len(pos))
+        return dv
 
 class Boids:
     """class that represents Boids simulation"""
-    def __init__(self, N):
+    def __init__(self, N, neighbors='dense', capacity=None, dtype=np.float64,
+                 fused=False):
         """initialize the Boids simulation"""
+        # The state is stored as a structure of arrays: one preallocated
+        # buffer of positions and one of velocities, with room for capacity
+        # boids of which the first N are active. self.pos and self.vel are
+        # views of the active rows, so adding or removing boids only touches
+        # the rows that change, and the buffers grow by doubling when full.
+        # dtype=np.float32 halves the memory taken by the state, the pair
+        # offsets and the rule temporaries; the pair indices stay int64.
+        self.N = 0
+        self.posBuf = np.zeros((max(capacity or N, 1), 2), dtype=dtype)
+        self.velBuf = np.zeros_like(self.posBuf)
+        # scratch arrays reused from tick to tick, by name
+        self.scratch = {}
+        # fused=True applies the rules with the compiled fusedKernel
+        if fused and fusedKernel is None:
+            raise ValueError('the fused rule kernel needs numba')
+        self.fused = fused
         # init position & velocities
         # create a numpy array to store (x, y) of all Boids
         # displaced from the center. Creates a 1D array of 2N random 
         # numbers in the range [0,1], times 10 = [0,10]
-        self.pos = [width/2.0, height/2.0] + 10*np.random.rand(2*N).reshape(N, 2)
+        pos = [width/2.0, height/2.0] + 10*np.random.rand(2*N).reshape(N, 2)
         # normalized random velocities
         # for each boid. given an angle, the pair of numbers (x, y) lie on a 
         # circle's circumference (unit vector dependent on the angle). 
         angles = 2*math.pi*np.random.rand(N)
         # create an array of random unit vectors using cos and sin of previous 
-        # calculated angles. Group coordinates (x, y) together using zip. Zip
-        # joins two lists inot a list of tuples. list() is needed because just
-        # calling zip will create only an iterator 
-        self.vel = np.array(list(zip(np.cos(angles), np.sin(angles))))
-        self.N = N
+        # calculated angles, stacked as the (x, y) columns of the array
+        vel = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+        self.insert(pos, vel)
         # min dist of approach between two boids
         self.minDist = 25.0
         # max magnitude of velocities calculated by "rules." Limits how much a 
@@ -42,11 +274,111 @@ class Boids:
         self.maxRuleVel = 0.03
         # max magnitude of final velocity, overall boid vel limit
         self.maxVel = 2.0
+        # radius within which boids align with and move towards each other
+        self.flockDist = 50.0
+        # how neighbors are found: 'dense' computes the full N x N distance
+        # matrix, 'grid' only compares boids in neighboring grid cells and
+        # 'kdtree' uses a k-d tree that wraps around the window edges.
+        # dense is the default: the flock starts as one clump where every
+        # boid is every other boid's neighbor, and there the pair backends
+        # only add the cost of finding the pairs. They pay off once a large
+        # flock has spread out over a large world.
+        self.neighbors = neighbors
+        # obstacles, attractors and repulsors, see ForceField
+        self.field = None
 
-    def tick(self, frameNum, pts, head):
-        """update the boids for each frame of the animation"""
+    @property
+    def pos(self):
+        """positions of the active boids, a view of the position buffer"""
+        return self.posBuf[:self.N]
+
+    @pos.setter
+    def pos(self, value):
+        self._assign(self.posBuf, value, 'positions')
+
+    @property
+    def vel(self):
+        """velocities of the active boids, a view of the velocity buffer"""
+        return self.velBuf[:self.N]
+
+    @vel.setter
+    def vel(self, value):
+        self._assign(self.velBuf, value, 'velocities')
+
+    def _assign(self, buf, value, what):
+        """copy value into the active rows of buf"""
+        active = buf[:self.N]
+        # in-place updates like self.pos += self.vel hand back the view
+        # itself, which needs no copy
+        if (isinstance(value, np.ndarray) and value.shape == active.shape and
+                value.strides == active.strides and
+                value.__array_interface__['data'][0] ==
+                active.__array_interface__['data'][0]):
+            return
+        if len(value) != self.N:
+            raise ValueError('got %d %s for %d boids, use insert() or '
+                             'remove() to change the number of boids'
+                             % (len(value), what, self.N))
+        # a copy first, since value may overlap the buffer, as in
+        # pos[::-1]
+        active[:] = np.array(value)
+
+    def reserve(self, capacity):
+        """make room for at least capacity boids"""
+        if capacity <= len(self.posBuf):
+            return
+        # grow by doubling, so adding boids one at a time copies the state
+        # only O(log N) times
+        capacity = max(capacity, 2*len(self.posBuf))
+        for name in ('posBuf', 'velBuf'):
+            old = getattr(self, name)
+            new = np.zeros((capacity, 2), dtype=old.dtype)
+            new[:self.N] = old[:self.N]
+            setattr(self, name, new)
+
+    def insert(self, pos, vel=None):
+        """add boids at positions pos, with random unit velocities by default"""
+        pos = np.asarray(pos, dtype=self.posBuf.dtype).reshape(-1, 2)
+        k = len(pos)
+        if vel is None:
+            angles = 2*math.pi*np.random.rand(k)
+            vel = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+        self.reserve(self.N + k)
+        self.posBuf[self.N:self.N+k] = pos
+        self.velBuf[self.N:self.N+k] = vel
+        self.N += k
+
+    def remove(self, indices):
+        """remove the boids at indices; the last boids move into the gaps"""
+        # swap-remove: only as many rows as are removed are copied, so the
+        # order of the remaining boids changes
+        gone = np.zeros(self.N, dtype=bool)
+        gone[indices] = True
+        k = int(gone.sum())
+        newN = self.N - k
+        # gaps in the rows that are kept, and survivors past the new end
+        holes = np.nonzero(gone[:newN])[0]
+        movers = newN + np.nonzero(~gone[newN:])[0]
+        self.posBuf[holes] = self.posBuf[movers]
+        self.velBuf[holes] = self.velBuf[movers]
+        self.N = newN
+
+    def work(self, name):
+        """N x 2 scratch array that is reused across ticks"""
+        # grown along with the boid buffers, and never shrunk
+        buf = self.scratch.get(name)
+        if buf is None or len(buf) < len(self.posBuf):
+            buf = np.empty_like(self.posBuf)
+            self.scratch[name] = buf
+        return buf[:self.N]
+
+    def step(self):
+        """advance the simulation one tick, without drawing anything"""
         # apply rules
         self.vel += self.applyRules()
+        # steer around obstacles and towards or away from points
+        if self.field is not None:
+            self.vel += self.field.apply(self.pos)
         # limit the computed velocities of the boids
         self.limit(self.vel, self.maxVel)
         # compute updated positions of the boids by adding the new velocity vectors
@@ -54,13 +386,19 @@ class Boids:
         self.pos += self.vel
         # apply boundary condition
         self.applyBC()
+
+    def tick(self, frameNum, pts, head):
+        """update the boids for each frame of the animation"""
+        self.step()
         # update the boid head and body position
         # apply new position with ::2 to pick out the even number elements (x-axis values)
         # and 1::2 to pick out the odd numbered elements (y-axis values)
         pts.set_data(self.pos.reshape(2*self.N)[::2],
                      self.pos.reshape(2*self.N)[1::2])
         # calculate position of head H = P + k*V, k = 10
-        vec = self.pos + 10*self.vel/self.maxVel
+        vec = self.work('head')
+        np.multiply(self.vel, 10/self.maxVel, out=vec)
+        vec += self.pos
         head.set_data(vec.reshape(2*self.N)[::2], vec.reshape(2*self.N)[1::2])
 
     # limit the velocities
@@ -73,19 +411,23 @@ class Boids:
         if mag > maxVal:
             vec[0], vec[1] = vec[0]*maxVal/mag, vec[1]*maxVal/mag
 
-    def limit(self, X, maxVal):
-        """limit the magnitude of the 2D vector in array X to maxValue"""
+    def limitLoop(self, X, maxVal):
+        """limit the magnitude of the 2D vector in array X to maxValue, one at a time"""
         # extract velocity vectors from an array and pass it to limitVec
         for vec in X:
             self.limitVec(vec, maxVal)
 
+    def limit(self, X, maxVal):
+        """limit the magnitude of the 2D vector in array X to maxValue"""
+        # same as limitLoop(), for all the vectors at once: compute every
+        # magnitude, then scale only the rows that exceed the max, in the
+        # same order of operations as limitVec(), so results agree to rounding
+        mag = norm(X, axis=1)
+        over = mag > maxVal
+        X[over] = X[over]*maxVal/mag[over].reshape(-1, 1)
 
-    def applyBC(self):
-        """apply boundary conditions"""
-        # deltaR provides a slight buffer which allows the boid to move 
-        # slightly outside the window before it starts coming back from 
-        # the opposite direction for better visual effect.
-        deltaR = 2.0
+    def applyBCLoop(self):
+        """apply boundary conditions, one boid at a time"""
         # this method applies the tiled boundary conditions to each 
         # set of boid coordinates in pos array.
         for coord in self.pos:
@@ -98,7 +440,65 @@ class Boids:
             if coord[1] < - deltaR:
                 coord[1] = height + deltaR
 
+    def applyBC(self):
+        """apply boundary conditions"""
+        # same tiled boundary as applyBCLoop(), with Boolean masks over each
+        # column of pos. A boid sent to -deltaR is not past -deltaR, so the
+        # second test of each axis never undoes the first, as in the loop.
+        for axis, size in ((0, width), (1, height)):
+            coord = self.pos[:, axis]
+            coord[coord > size + deltaR] = - deltaR
+            coord[coord < - deltaR] = size + deltaR
+
     def applyRules(self):
+        """velocity changes from the separation, alignment and cohesion rules"""
+        if self.neighbors == 'dense':
+            return self.applyRulesDense()
+        return self.applyRulesTo(*self.pairs())
+
+    def pairs(self):
+        """each boid's neighbors within the alignment distance, as pairs"""
+        if self.neighbors == 'kdtree':
+            return kdtreePairs(self.pos, self.flockDist)
+        return gridPairs(self.pos, self.flockDist)
+
+    def applyRulesTo(self, i, j, delta):
+        """the three rules over the neighbor pairs, fused if asked for"""
+        if self.fused:
+            out = self.work('rules')
+            fusedKernel(i, j, delta, self.pos, self.vel, self.minDist,
+                        self.maxRuleVel, self.work('sep'), self.work('align'),
+                        self.work('coh'), out)
+            return out
+        return self.applyRulesPairs(i, j, delta)
+
+    def applyRulesPairs(self, i, j, delta):
+        """the three rules, summed over the neighbor pairs (i, j) with
+        delta = pos[i] - pos[j]"""
+        # these are the same sums as the products with the Boolean matrices
+        # D in applyRulesDense(), but only over the pairs that are True:
+        # each sumPairs() is a sparse matrix product. They are written with
+        # delta rather than pos[j] so that on the wrapped-around world each
+        # neighbor is seen at its nearest copy, pos[i] - delta.
+
+        # rule #1: separation, from the pairs closer than minDist
+        close = norm(delta, axis=1) < self.minDist
+        vel = sumPairs(i[close], delta[close], self.N)
+        self.limit(vel, self.maxRuleVel)
+
+        # rule #2: alignment. D.dot(self.vel) includes each boid itself.
+        vel2 = self.vel + sumPairs(i, self.vel[j], self.N)
+        self.limit(vel2, self.maxRuleVel)
+        vel += vel2
+
+        # rule #3: cohesion. D.dot(self.pos) - self.pos leaves the neighbors.
+        vel3 = sumPairs(i, self.pos[i] - delta, self.N)
+        self.limit(vel3, self.maxRuleVel)
+        vel += vel3
+
+        return vel
+
+    def applyRulesDense(self):
     # get pairwise distances between boids
         self.distMatrix = squareform(pdist(self.pos))
 
@@ -113,7 +513,7 @@ class Boids:
 
     # distance threshold for alignment (different from separation)
     # new Boolean matrix with 50 pixel threshold
-        D = self.distMatrix < 50.0
+        D = self.distMatrix < self.flockDist
 
     # apply rule #2: alignment
     # broad definition of flockmates. Each boid is influcence by and aligns
@@ -142,18 +542,13 @@ class Boids:
         """event handler for matplotlib button presses"""
         # left-click to add a new boid at the mouse click position
         if event.button == 1:
-            # append the mouse location given by (event.xdata, event.ydata) to the
-            # pos array.
-            self.pos = np.concatenate((self.pos,
-                                    np.array([[event.xdata, event.ydata]])), 
-                                    axis=0)
             # generate a random velocity for the new boid
             angles = 2*math.pi*np.random.rand(1)
-            v = np.array(list(zip(np.sin(angles), np.cos(angles))))
-            # generate a random velocity for the new boid and append it to the vel array.
-            self.vel = np.concatenate((self.vel, v), axis=0)
-            # increment the boid count
-            self.N += 1
+            v = np.stack((np.sin(angles), np.cos(angles)), axis=1)
+            # add the boid at the mouse location given by (event.xdata,
+            # event.ydata) into the spare capacity of the pos and vel
+            # buffers; insert() increments the boid count
+            self.insert([[event.xdata, event.ydata]], v)
         # right click to scatter the boids, 3 = right mouse button
         elif event.button == 3:
             # add a scattering velocity
@@ -164,6 +559,294 @@ class Boids:
             # control the scattering speed.
             self.vel += 0.1*(self.pos - np.array([[event.xdata, event.ydata]]))
 
+def checkVectorized(N=1000, trials=5):
+    """check limit() and applyBC() against their loop versions"""
+    ok = True
+    boids = Boids(N)
+    for trial in range(trials):
+        # vectors on both sides of the limits, and boids on both sides
+        # of every edge of the window
+        for maxVal in (boids.maxRuleVel, boids.maxVel):
+            X = maxVal*4*(np.random.rand(N, 2) - 0.5)
+            expected = X.copy()
+            boids.limitLoop(expected, maxVal)
+            boids.limit(X, maxVal)
+            # norm() of a single vector may round its last bit differently
+            if not np.allclose(X, expected, rtol=1e-12, atol=0):
+                print('limit() differs from limitLoop(), maxVal %g' % maxVal)
+                ok = False
+        pos = np.random.rand(N, 2)*[width + 20, height + 20] - 10
+        boids.pos = pos.copy()
+        boids.applyBCLoop()
+        expected = boids.pos.copy()
+        boids.pos = pos.copy()
+        boids.applyBC()
+        if not np.array_equal(boids.pos, expected):
+            print('applyBC() differs from applyBCLoop()')
+            ok = False
+    if fusedKernel is not None:
+        # the fused kernel against the NumPy rules, on a flock dense enough
+        # for all three rules to matter
+        for neighbors in ('grid', 'kdtree'):
+            boids = Boids(N, neighbors)
+            boids.pos = np.random.rand(N, 2)*[width/4, height/4]
+            expected = boids.applyRules()
+            boids.fused = True
+            if not np.allclose(boids.applyRules(), expected, rtol=1e-9, atol=1e-12):
+                print('fused rules differ from applyRulesPairs(), %s' % neighbors)
+                ok = False
+    if ok:
+        print('limit(), applyBC() and the fused rules match their reference versions')
+    return ok
+
+class TrajectoryWriter:
+    """records boid positions and velocities to a directory of .npy chunks"""
+    # Each chunk is a preallocated, memory-mapped array of chunkTicks x N x 4
+    # values (x, y, vx, vy), so recording a tick is a copy into the file and
+    # never grows an array in memory. New chunks are added as the run goes
+    # on, and meta.json says how many ticks are valid, so a run that is
+    # stopped early can still be read. every is the number of simulation
+    # ticks between recorded ones, so recorded tick t is simulation tick
+    # t*every.
+    def __init__(self, dirName, N, chunkTicks=1024, dtype=np.float64, every=1):
+        os.makedirs(dirName, exist_ok=True)
+        self.dirName = dirName
+        self.N = N
+        self.chunkTicks = chunkTicks
+        self.every = every
+        self.dtype = np.dtype(dtype)
+        self.ticks = 0
+        self.chunk = None
+
+    def writeMeta(self):
+        """write the run's shape and length to meta.json"""
+        meta = {'N': self.N, 'chunkTicks': self.chunkTicks,
+                'ticks': self.ticks, 'every': self.every,
+                'dtype': self.dtype.str,
+                'columns': ['x', 'y', 'vx', 'vy']}
+        with open(os.path.join(self.dirName, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def write(self, pos, vel):
+        """append one tick of positions and velocities"""
+        row = self.ticks % self.chunkTicks
+        if row == 0:
+            if self.chunk is not None:
+                self.chunk.flush()
+            fileName = os.path.join(self.dirName,
+                                    'chunk%05d.npy' % (self.ticks // self.chunkTicks))
+            self.chunk = np.lib.format.open_memmap(
+                fileName, mode='w+', dtype=self.dtype,
+                shape=(self.chunkTicks, self.N, 4))
+            self.writeMeta()
+        self.chunk[row, :, :2] = pos
+        self.chunk[row, :, 2:] = vel
+        self.ticks += 1
+
+    def close(self):
+        """flush the last chunk and record the final length"""
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.chunk = None
+        self.writeMeta()
+
+class TrajectoryReader:
+    """memory-mapped access to a run recorded by TrajectoryWriter"""
+    def __init__(self, dirName):
+        with open(os.path.join(dirName, 'meta.json')) as f:
+            meta = json.load(f)
+        self.N = meta['N']
+        self.chunkTicks = meta['chunkTicks']
+        self.ticks = meta['ticks']
+        # simulation ticks per recorded tick; 1 in recordings made before
+        # it was saved
+        self.every = meta.get('every', 1)
+        nChunks = -(-self.ticks // self.chunkTicks)
+        self.chunks = [np.load(os.path.join(dirName, 'chunk%05d.npy' % k),
+                               mmap_mode='r') for k in range(nChunks)]
+
+    def __len__(self):
+        return self.ticks
+
+    def __getitem__(self, t):
+        """N x 4 array of (x, y, vx, vy) of every boid at recorded tick t,
+        which is simulation tick t*every"""
+        if not 0 <= t < self.ticks:
+            raise IndexError('tick %d not in recording of %d ticks' % (t, self.ticks))
+        return self.chunks[t // self.chunkTicks][t % self.chunkTicks]
+
+# shared memory blocks attached by each worker process, by name
+gShared = {}
+# the flock's ForceField, sent to each worker process once when it starts
+gField = None
+
+def _initWorker(field):
+    """worker: keep the force field, with its k-d trees already built"""
+    global gField
+    gField = field
+
+def _tickStrip(task):
+    """worker: advance the boids of one strip of the world by one tick"""
+    (srcName, dstName, N, x0, x1, world, params) = task
+    # the world size is passed along, since spawned workers don't see
+    # changes main() made to the module globals
+    global width, height
+    width, height = world
+    for name in (srcName, dstName):
+        if name not in gShared:
+            gShared[name] = shared_memory.SharedMemory(name=name)
+    src = np.ndarray((2, N, 2), params['dtype'], gShared[srcName].buf)
+    dst = np.ndarray((2, N, 2), params['dtype'], gShared[dstName].buf)
+    pos, vel = src[0], src[1]
+    x = pos[:, 0]
+    owned = np.nonzero((x >= x0) & (x < x1))[0]
+    # ghost boids: boids of other strips within the flocking distance of
+    # this one, read straight from shared memory. Distances are measured
+    # around the wrapped world too, for the kdtree neighbors.
+    # The outer strips end at the edges of that world, -deltaR and
+    # width + deltaR.
+    span = width + 2*deltaR
+    below = np.mod(max(x0, -deltaR) - x, span)
+    above = np.mod(x - min(x1, width + deltaR), span)
+    # a strip the flock has left has nothing to do
+    if len(owned) == 0:
+        return
+    ghost = np.nonzero(((below < params['flockDist']) |
+                        (above < params['flockDist'])) &
+                       ~((x >= x0) & (x < x1)))[0]
+    # a private flock of the owned boids followed by the ghosts
+    local = Boids(0, params['neighbors'], len(owned) + len(ghost),
+                  params['dtype'], params['fused'])
+    local.insert(pos[np.concatenate((owned, ghost))],
+                 vel[np.concatenate((owned, ghost))])
+    for name in ('minDist', 'maxRuleVel', 'maxVel', 'flockDist'):
+        setattr(local, name, params[name])
+    local.field = gField
+    local.step()
+    # only the owned boids are written back; the ghosts belong to the
+    # strips next door, which have their full neighborhoods
+    n = len(owned)
+    dst[0][owned] = local.pos[:n]
+    dst[1][owned] = local.vel[:n]
+
+class ParallelBoids:
+    """runs a flock in a pool of worker processes, one strip of the world each"""
+    # The world is cut into vertical strips, one per worker. Positions and
+    # velocities live in two shared memory buffers. Each tick every worker
+    # reads the boids of its strip and the ghost boids near its edges from
+    # one buffer, and writes its own boids' next state into the other; then
+    # the buffers swap. Each boid is always computed from the same
+    # neighbors in the same order, so for a fixed seed and worker count the
+    # results are the same from run to run.
+    def __init__(self, boids, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.N = boids.N
+        self.params = {'neighbors': boids.neighbors, 'minDist': boids.minDist,
+                       'maxRuleVel': boids.maxRuleVel, 'maxVel': boids.maxVel,
+                       'flockDist': boids.flockDist,
+                       'dtype': boids.posBuf.dtype, 'fused': boids.fused}
+        size = max(2*self.N*2*boids.posBuf.itemsize, 1)
+        self.buffers = [shared_memory.SharedMemory(create=True, size=size)
+                        for i in range(2)]
+        self.current = 0
+        self.state()[0] = boids.pos
+        self.state()[1] = boids.vel
+        # strip edges; the outer strips also take the boids in the deltaR
+        # buffer beyond the window
+        edges = np.linspace(0, width, self.workers + 1)
+        edges[0], edges[-1] = -np.inf, np.inf
+        self.strips = list(zip(edges[:-1], edges[1:]))
+        # the force field does not change, so rather than pickle it into
+        # every task, each worker gets it once, trees built, as it starts
+        if boids.field is not None:
+            boids.field.build()
+        self.pool = multiprocessing.Pool(self.workers, initializer=_initWorker,
+                                         initargs=(boids.field,))
+
+    def state(self):
+        """2 x N x 2 view of the current positions and velocities"""
+        buf = self.buffers[self.current].buf
+        return np.ndarray((2, self.N, 2), self.params['dtype'], buf)
+
+    @property
+    def pos(self):
+        return self.state()[0]
+
+    @property
+    def vel(self):
+        return self.state()[1]
+
+    def step(self):
+        """advance every strip one tick"""
+        src = self.buffers[self.current].name
+        dst = self.buffers[1 - self.current].name
+        self.pool.map(_tickStrip, [(src, dst, self.N, x0, x1, (width, height),
+                                    self.params) for x0, x1 in self.strips])
+        self.current = 1 - self.current
+
+    def close(self):
+        """stop the workers and free the shared memory"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+        for shm in self.buffers:
+            shm.close()
+            shm.unlink()
+        self.buffers = []
+
+    def __del__(self):
+        self.close()
+
+def checkParallel(N=200, workers=4, ticks=5):
+    """check that ParallelBoids repeats itself and follows the serial step"""
+    # The default flock starts as a clump at the center, so most strips
+    # have no boids of their own at first.
+    ok = True
+    for neighbors in ('dense', 'grid', 'kdtree'):
+        np.random.seed(1)
+        serial = Boids(N, neighbors)
+        start = (serial.pos.copy(), serial.vel.copy())
+        runs = []
+        for run in range(2):
+            flock = Boids(0, neighbors)
+            flock.insert(*start)
+            parallel = ParallelBoids(flock, workers)
+            for t in range(ticks):
+                parallel.step()
+            runs.append((parallel.pos.copy(), parallel.vel.copy()))
+            parallel.close()
+        for t in range(ticks):
+            serial.step()
+        if not all(np.array_equal(a, b) for a, b in zip(*runs)):
+            print('ParallelBoids is not deterministic, %s' % neighbors)
+            ok = False
+        if not np.allclose(runs[0][0], serial.pos, rtol=0, atol=1e-9):
+            print('ParallelBoids differs from the serial step, %s' % neighbors)
+            ok = False
+    if ok:
+        print('ParallelBoids is deterministic and matches the serial step')
+    return ok
+
+def runHeadless(boids, ticks, outDir=None, every=1, chunkTicks=1024):
+    """advance the boids for a number of ticks without drawing, optionally
+    recording every k-th tick to outDir"""
+    writer = None
+    if outDir:
+        writer = TrajectoryWriter(outDir, boids.N, chunkTicks, boids.pos.dtype,
+                                  every)
+        writer.write(boids.pos, boids.vel)
+    start = time.perf_counter()
+    for t in range(1, ticks + 1):
+        boids.step()
+        if writer is not None and t % every == 0:
+            writer.write(boids.pos, boids.vel)
+    elapsed = time.perf_counter() - start
+    if writer is not None:
+        writer.close()
+    print('%d ticks of %d boids in %.2f s (%.1f ticks/s)' %
+          (ticks, boids.N, elapsed, ticks/max(elapsed, 1e-9)))
+    return ticks/max(elapsed, 1e-9)
+
 def tick(frameNum, pts, head, boids):
     """update function for animation"""
     boids.tick(frameNum, pts, head)
@@ -173,21 +856,119 @@ def main():
     # use sys.argv if needed
     print('starting boids...')
 
-    parser = argparse.ArgumentParser(description="Implementing Craig Reynolds' Boids...")
+    # arguments can also be read from a file, one per line, with
+    # python boids.py @obstacles.txt, for thousands of obstacles
+    parser = argparse.ArgumentParser(description="Implementing Craig Reynolds' Boids...",
+                                     fromfile_prefix_chars='@')
 
     # add arguments
     # use the argparse module to accept command line arguments
     # --num-boids argument to set the initial number of boids
     parser.add_argument('--num-boids', dest='N', required=False)
+    # --neighbors dense uses the full N x N distance matrix, grid a
+    # spatial hash of 50 pixel cells, kdtree a k-d tree whose distances
+    # wrap around the window like the boids do. dense is fastest for the
+    # clumped start and small flocks; grid and kdtree only pay off for
+    # flocks of thousands spread over a large --world, and do not need
+    # the N x N matrices
+    parser.add_argument('--neighbors', dest='neighbors',
+                        choices=['dense', 'grid', 'kdtree'],
+                        default='dense', required=False)
+    # run this many ticks without display, as fast as possible
+    parser.add_argument('--headless', dest='headless', type=int, required=False)
+    # record positions and velocities of headless runs to this directory,
+    # every k-th tick
+    parser.add_argument('--out', dest='out', required=False)
+    parser.add_argument('--record-every', dest='every', type=int, default=1,
+                        required=False)
+    # random seed, so runs can be repeated
+    parser.add_argument('--seed', dest='seed', type=int, required=False)
+    # size of the world as WIDTHxHEIGHT, 640x480 by default
+    parser.add_argument('--world', dest='world', required=False)
+    # step headless runs in this many worker processes, one strip each
+    parser.add_argument('--workers', dest='workers', type=int, required=False)
+    # obstacles the boids steer around: --obstacle x,y,R, as often as needed
+    parser.add_argument('--obstacle', dest='obstacles', action='append',
+                        default=[], required=False)
+    # points the boids fly towards (food) or away from (predators) when
+    # within R: --attractor x,y,R[,strength], --repulsor x,y,R[,strength]
+    parser.add_argument('--attractor', dest='attractors', action='append',
+                        default=[], required=False)
+    parser.add_argument('--repulsor', dest='repulsors', action='append',
+                        default=[], required=False)
+    # constant wind pushing every boid: --wind vx,vy
+    parser.add_argument('--wind', dest='wind', required=False)
+    # keep the state in float32 instead of float64
+    parser.add_argument('--float32', action='store_true', required=False)
+    # apply the rules with the compiled kernel, if numba is installed
+    parser.add_argument('--fused', action='store_true', required=False)
+    # check the vectorized methods against their loop versions and exit
+    parser.add_argument('--check', action='store_true', required=False)
     args = parser.parse_args()
 
+    if args.check:
+        ok = checkVectorized()
+        ok = checkParallel() and ok
+        raise SystemExit(0 if ok else 1)
+    if args.fused and fusedKernel is None:
+        parser.error('--fused needs numba')
+    if args.fused and args.neighbors == 'dense':
+        parser.error('--fused works on neighbor pairs, use --neighbors grid '
+                     'or kdtree')
+
     # set the initial number of boids if not argument is given
     N = 100
     if args.N:
         N = int(args.N)
 
+    if args.world:
+        global width, height
+        width, height = map(int, args.world.lower().split('x'))
+
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
     # create boids and set the boids in motion
-    boids = Boids(N)
+    boids = Boids(N, args.neighbors,
+                  dtype=np.float32 if args.float32 else np.float64,
+                  fused=args.fused)
+
+    # parse the force fields, which all go into one ForceField
+    usage = ('use --obstacle x,y,R, --attractor/--repulsor x,y,R[,strength] '
+             'and --wind vx,vy')
+    try:
+        obstacles = [list(map(float, s.split(','))) for s in args.obstacles]
+        points = []
+        for specs, sign in ((args.attractors, 1), (args.repulsors, -1)):
+            for s in specs:
+                values = list(map(float, s.split(',')))
+                if len(values) not in (3, 4):
+                    parser.error(usage)
+                # default strength: as strong as one flocking rule
+                if len(values) == 3:
+                    values.append(boids.maxRuleVel)
+                points.append(values[:3] + [sign*abs(values[3])])
+        wind = list(map(float, args.wind.split(','))) if args.wind else (0, 0)
+    except ValueError as e:
+        parser.error('bad force field value: %s' % e)
+    if any(len(o) != 3 for o in obstacles) or len(wind) != 2:
+        parser.error(usage)
+    if obstacles or points or args.wind:
+        boids.field = ForceField(wind=wind)
+        boids.field.addObstacles(obstacles)
+        boids.field.addPoints(points)
+
+    if args.headless is not None:
+        if args.workers:
+            boids = ParallelBoids(boids, args.workers)
+        runHeadless(boids, args.headless, args.out, args.every)
+        if args.workers:
+            boids.close()
+        return
+
+    # only now load matplotlib, since the display needs it
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
 
     # set the matplotlib figure and axes
     # P = body center, H = head center, V = velocity, k = constant distance P to H 
@@ -200,6 +981,20 @@ def main():
     # the  , syntax picks up the first and only element in this list
     pts, = ax.plot([], [], markersize=10, c='k', marker='o', ls='None')
     head, = ax.plot([], [], markersize=4, c='r', marker='o', ls='None')
+    # draw the obstacles as gray circles in a single collection, which
+    # stays fast with thousands of them, and attractors (green) and
+    # repulsors (red) as crosses
+    if boids.field is not None:
+        from matplotlib.collections import EllipseCollection
+        field = boids.field
+        diameters = 2*field.obstacles[:, 2]
+        ax.add_collection(EllipseCollection(diameters, diameters, 0, units='xy',
+                                            offsets=field.obstacles[:, :2],
+                                            offset_transform=ax.transData,
+                                            facecolors='0.8', edgecolors='0.5'))
+        for sign, color in ((1, 'g'), (-1, 'r')):
+            points = field.points[np.sign(field.points[:, 3]) == sign]
+            ax.plot(points[:, 0], points[:, 1], c=color, marker='x', ls='None')
     # sets callback function tick() to be called for every frame of the animation
     # fargs specifies the arguments of the callback function
     # time interval 50 milliseconds
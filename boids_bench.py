@@ -0,0 +1,251 @@
+"""
+boids_bench.py
+
+Speed and memory checks for the Boids simulation in boids.py.
+"""
+
+# run with:
+# python boids_bench.py                          phase timings, N = 100 to 1e6
+# python boids_bench.py --sizes 100,1000 --neighbors grid,kdtree
+# python boids_bench.py --save v2.json --compare v1.json
+# python boids_bench.py --modes --num-boids 20000  compare the precision modes
+
+import sys, time, json, platform, argparse, tracemalloc
+import numpy as np
+import boids
+
+# flock sizes and neighbor backends of the scaling profile
+SIZES = [100, 1000, 10000, 100000, 1000000]
+NEIGHBORS = ['dense', 'grid', 'kdtree']
+# the phases of Boids.step(), in order
+PHASES = ['search', 'rules', 'field', 'limit', 'move', 'bc']
+# boids per default 640 x 480 window: the world grows with N so that
+# every flock has the same density, about 25 neighbors per boid
+DENSITY = 1000/(640*480)
+
+# state precision and rule kernel of each mode
+MODES = [('float64', np.float64, False), ('float32', np.float32, False),
+         ('float64-fused', np.float64, True), ('float32-fused', np.float32, True)]
+
+
+def makeFlock(N, neighbors, dtype=np.float64, fused=False, seed=0):
+    """N boids spread evenly over the world"""
+    # the default flock starts as one clump around the center, where every
+    # boid is every other boid's neighbor; spread out, the cost per tick is
+    # the one of a flock that has been flying for a while
+    np.random.seed(seed)
+    flock = boids.Boids(N, neighbors, dtype=dtype, fused=fused)
+    flock.pos = np.random.rand(N, 2)*[boids.width, boids.height]
+    return flock
+
+
+def peakMemory(func, *args):
+    """result of func(*args) and the peak bytes of temporaries it allocated"""
+    # NumPy reports its array allocations to tracemalloc. The peak above
+    # the memory in use before the call is the most the call allocated at
+    # once. It is not the memory traffic: arrays that already exist, like
+    # the state or reused scratch arrays, are read and written without
+    # showing up here.
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak - before
+
+
+def tickMemory(flock):
+    """peak temporary bytes of the neighbor search and of the rules"""
+    # measured apart, since the neighbor search is the same in every mode
+    # and its peak would hide the one of the rules
+    pairs, searchMemory = peakMemory(flock.pairs)
+    rules, rulesMemory = peakMemory(flock.applyRulesTo, *pairs)
+    return searchMemory, rulesMemory
+
+
+def benchMode(N, neighbors, dtype, fused, seconds=1.0, maxTicks=1000):
+    """ticks/s and peak temporary bytes of the neighbor search and of the
+    rules for one mode"""
+    flock = makeFlock(N, neighbors, dtype, fused)
+    # one untimed tick, which also compiles the fused kernel
+    flock.step()
+    memory = tickMemory(flock)
+    ticks = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while ticks < maxTicks and elapsed < seconds:
+        flock.step()
+        ticks += 1
+        elapsed = time.perf_counter() - start
+    return (ticks/elapsed,) + memory
+
+
+def setWorld(N):
+    """size the world of boids.py for N boids at the benchmark density"""
+    scale = (N/DENSITY/(640*480))**0.5
+    boids.width, boids.height = 640*scale, 480*scale
+
+
+def timedStep(flock, times):
+    """Boids.step() with the time of each phase added to times"""
+    # the same steps as Boids.step(), with a clock between them. The dense
+    # backend finds neighbors and applies the rules in one go, so its
+    # search time is part of its rules time.
+    t0 = time.perf_counter()
+    if flock.neighbors == 'dense':
+        t1 = t0
+        dv = flock.applyRulesDense()
+    else:
+        pairs = flock.pairs()
+        t1 = time.perf_counter()
+        dv = flock.applyRulesTo(*pairs)
+    flock.vel += dv
+    t2 = time.perf_counter()
+    if flock.field is not None:
+        flock.vel += flock.field.apply(flock.pos)
+    t3 = time.perf_counter()
+    flock.limit(flock.vel, flock.maxVel)
+    t4 = time.perf_counter()
+    flock.pos += flock.vel
+    t5 = time.perf_counter()
+    flock.applyBC()
+    t6 = time.perf_counter()
+    for phase, start, stop in zip(PHASES, (t0, t1, t2, t3, t4, t5),
+                                  (t1, t2, t3, t4, t5, t6)):
+        times[phase] += stop - start
+
+
+def profile(N, neighbors, seconds=1.0, maxTicks=1000):
+    """ticks/s, seconds per tick of each phase and peak memory of one
+    flock of N boids"""
+    setWorld(N)
+    flock = makeFlock(N, neighbors)
+    # state, plus the peak of the temporaries of one tick
+    _, peak = peakMemory(flock.step)
+    peak += flock.posBuf.nbytes + flock.velBuf.nbytes
+    times = dict.fromkeys(PHASES, 0.0)
+    ticks = 0
+    start = time.perf_counter()
+    # at least one tick, however long it takes
+    while ticks < 1 or (ticks < maxTicks and
+                        time.perf_counter() - start < seconds):
+        timedStep(flock, times)
+        ticks += 1
+    elapsed = time.perf_counter() - start
+    return {'neighbors': neighbors, 'N': N, 'ticks': ticks,
+            'ticks_per_s': ticks/elapsed, 'peak_mb': peak/2**20,
+            'phases': {phase: t/ticks for phase, t in times.items()}}
+
+
+def compare(results, baseline, tolerance):
+    """print the change in ticks/s from a saved run, returning the
+    configurations that got slower than tolerance allows"""
+    old = {(r['neighbors'], r['N']): r for r in baseline['results']}
+    print('\ncompared with %s (%s)' % (baseline.get('label'), baseline.get('date')))
+    print('%-8s %8s %12s %12s %8s' % ('backend', 'N', 'old ticks/s',
+                                      'new ticks/s', 'ratio'))
+    slower = []
+    for r in results:
+        o = old.get((r['neighbors'], r['N']))
+        if o is None:
+            continue
+        ratio = r['ticks_per_s']/o['ticks_per_s']
+        flag = ''
+        if ratio < tolerance:
+            flag = ' REGRESSION'
+            slower.append((r['neighbors'], r['N'], ratio))
+        print('%-8s %8d %12.2f %12.2f %7.2fx%s' % (r['neighbors'], r['N'],
+                                                   o['ticks_per_s'],
+                                                   r['ticks_per_s'], ratio, flag))
+    return slower
+
+
+def runModes(N, neighbors, seconds):
+    """compare the precision modes on one flock"""
+    # peak temporary allocations in MB, and those of the rules relative
+    # to the float64 NumPy rules
+    print('%-14s %10s %16s %16s %10s' % ('mode', 'ticks/s', 'search alloc MB',
+                                          'rules alloc MB', 'vs float64'))
+    baseline = None
+    for name, dtype, fused in MODES:
+        if fused and boids.fusedKernel is None:
+            print('%-14s skipped, numba is not installed' % name)
+            continue
+        rate, search, rules = benchMode(N, neighbors, dtype, fused, seconds)
+        baseline = baseline or rules
+        print('%-14s %10.2f %16.2f %16.2f %9.1f%%' %
+              (name, rate, search/2**20, rules/2**20, 100.0*rules/baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the Boids "
+                                     "simulation in boids.py.")
+    parser.add_argument('--sizes', dest='sizes',
+                        default=','.join(map(str, SIZES)), required=False)
+    parser.add_argument('--neighbors', dest='neighbors',
+                        default=','.join(NEIGHBORS), required=False)
+    # the dense N x N matrices need 8 N^2 bytes each
+    parser.add_argument('--dense-max', dest='denseMax', type=int,
+                        default=10000, required=False)
+    # time spent on each backend and size
+    parser.add_argument('--seconds', dest='seconds', type=float, default=2.0,
+                        required=False)
+    # save the results as JSON, and compare them with an earlier save:
+    # configurations slower than tolerance x the old ticks/s are reported
+    # as regressions and the exit status is 1
+    parser.add_argument('--save', dest='save', required=False)
+    parser.add_argument('--compare', dest='compare', required=False)
+    parser.add_argument('--tolerance', dest='tolerance', type=float,
+                        default=0.8, required=False)
+    parser.add_argument('--label', dest='label', default='', required=False)
+    # compare the float32 and fused modes on one flock instead
+    parser.add_argument('--modes', action='store_true', required=False)
+    parser.add_argument('--num-boids', dest='N', type=int, default=5000,
+                        required=False)
+    args = parser.parse_args()
+
+    backends = args.neighbors.split(',')
+    for neighbors in backends:
+        if neighbors not in NEIGHBORS:
+            parser.error('unknown backend %r, choose from %s' %
+                         (neighbors, ', '.join(NEIGHBORS)))
+
+    if args.modes:
+        for neighbors in backends:
+            if neighbors != 'dense':
+                print('%s neighbors, %d boids' % (neighbors, args.N))
+                runModes(args.N, neighbors, args.seconds)
+        return
+
+    print('%-8s %8s %10s %9s' % ('backend', 'N', 'ticks/s', 'peak MB') +
+          ''.join('%9s' % p for p in PHASES) + '  (ms per tick)')
+    results = []
+    for neighbors in backends:
+        for N in map(int, args.sizes.split(',')):
+            if neighbors == 'dense' and N > args.denseMax:
+                continue
+            r = profile(N, neighbors, args.seconds)
+            print('%-8s %8d %10.2f %9.1f' % (neighbors, N, r['ticks_per_s'],
+                                             r['peak_mb']) +
+                  ''.join('%9.2f' % (1000*r['phases'][p]) for p in PHASES))
+            sys.stdout.flush()
+            results.append(r)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'label': args.label, 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__, 'results': results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            print('%d configuration(s) slower than %.0f%% of the saved run' %
+                  (len(slower), 100*args.tolerance))
+            sys.exit(1)
+
+
+# call main
+if __name__ == '__main__':
+    main()
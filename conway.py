@@ -6,10 +6,15 @@ A simple Python/matplotlib implementation of Conway's Game of Life
 Author: Katherine Oriol
 """
 
-import sys, argparse
+import sys, os, re, time, argparse
+import threading, multiprocessing
+from collections import OrderedDict
+from multiprocessing import shared_memory
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+import hashlife
+import conway_export
+# matplotlib is only imported in main() when the animation is shown, so
+# headless runs neither need it installed nor pay for importing it
 
 def randomGrid(N):
 # set the initial conditions as random: Randomnly choose either 0 
@@ -37,12 +42,158 @@ def addGlider(i, j, grid):
     # placed at the specified corner coordinate (i, j)
     grid[i:i+3, j:j+3] = glider
 
-def update(frameNum, img, grid, N):
-    # copy grid since we require 8 neighbors for calculation
-    # and we go up by line
+# The Gosper glider gun: two blocks that shuttle back and forth and fire
+# a new glider every 30 generations, using a numpy array of shape 11 by 38.
+def addGosperGliderGun(i, j, grid):
+    """adds a Gosper Glider Gun with top left cell at (i, j)"""
+    gun = np.zeros(11*38).reshape(11, 38)
+
+    gun[5][1] = gun[5][2] = 255
+    gun[6][1] = gun[6][2] = 255
+
+    gun[3][13] = gun[3][14] = 255
+    gun[4][12] = gun[4][16] = 255
+    gun[5][11] = gun[5][17] = 255
+    gun[6][11] = gun[6][15] = gun[6][17] = gun[6][18] = 255
+    gun[7][11] = gun[7][17] = 255
+    gun[8][12] = gun[8][16] = 255
+    gun[9][13] = gun[9][14] = 255
+
+    gun[1][25] = 255
+    gun[2][23] = gun[2][25] = 255
+    gun[3][21] = gun[3][22] = 255
+    gun[4][21] = gun[4][22] = 255
+    gun[5][21] = gun[5][22] = 255
+    gun[6][23] = gun[6][25] = 255
+    gun[7][25] = 255
+
+    gun[3][35] = gun[3][36] = 255
+    gun[4][35] = gun[4][36] = 255
+
+    grid[i:i+11, j:j+38] = gun
+
+# The R-pentomino: a methuselah of just five cells that takes 1103
+# generations to settle down, using a numpy array of shape 3 by 3.
+def addRPentomino(i, j, grid):
+    """adds an R-pentomino with top left cell at (i, j)"""
+    rpent = np.array([[0, 255, 255],
+                      [255, 255, 0],
+                      [0, 255, 0]])
+    grid[i:i+3, j:j+3] = rpent
+
+# Any pattern array can be copied into the grid the same way as the glider,
+# with the numpy splice operation placing its top-left corner at (i, j)
+def addPattern(i, j, pattern, grid):
+    """adds a 0/255 pattern array with top left cell at (i, j)"""
+    rows, cols = pattern.shape
+    grid[i:i+rows, j:j+cols] = pattern
+
+# Pattern files. The files are read one line at a time and decoded straight
+# into the pattern array, so the whole text is never held in memory.
+def readRLE(fileName):
+    """read a pattern in run length encoded (.rle) format"""
+    # an RLE file has '#' comment lines, then a header like
+    # 'x = 3, y = 3, rule = B3/S23', then runs like '2bo$obo$b2o!'. 'b' is
+    # an OFF cell, 'o' an ON cell, '$' ends a row and '!' ends the pattern.
+    # A number in front of any of them repeats it.
+    pattern = None
+    i = j = 0
+    count = ''
+    with open(fileName) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if pattern is None:
+                fields = {}
+                for field in line.split(','):
+                    key, sep, value = field.partition('=')
+                    fields[key.strip()] = value.strip()
+                if 'x' not in fields or 'y' not in fields:
+                    raise ValueError('%s: missing "x = ..., y = ..." header'
+                                     % fileName)
+                pattern = np.zeros((int(fields['y']), int(fields['x'])),
+                                   dtype=np.uint8)
+                continue
+            for ch in line:
+                if ch.isdigit():
+                    count += ch
+                    continue
+                n = int(count) if count else 1
+                count = ''
+                if ch == '$':
+                    i += n
+                    j = 0
+                elif ch == '!':
+                    return pattern
+                elif ch.isalpha():
+                    if i >= pattern.shape[0] or j + n > pattern.shape[1]:
+                        raise ValueError('%s: pattern larger than its x/y '
+                                         'header' % fileName)
+                    # 'b' is OFF; 'o' and the letters of multi-state
+                    # rules are ON
+                    if ch != 'b':
+                        pattern[i, j:j+n] = ON
+                    j += n
+    if pattern is None:
+        raise ValueError('%s: no pattern found' % fileName)
+    return pattern
+
+def readPlaintext(fileName):
+    """read a pattern in plaintext (.cells) format"""
+    # a plaintext file has '!' comment lines, then one line per row with
+    # '.' for an OFF cell and 'O' (or '*') for an ON cell. Rows may stop
+    # early, so remember where the ON cells are and size the grid after.
+    onCells = []
+    rows = cols = 0
+    with open(fileName) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if line.startswith('!'):
+                continue
+            onCells.append([j for j, ch in enumerate(line) if ch in 'O*'])
+            cols = max(cols, len(line))
+            rows += 1
+    pattern = np.zeros((rows, cols), dtype=np.uint8)
+    for i, js in enumerate(onCells):
+        pattern[i, js] = ON
+    return pattern
+
+def readBoard(fileName):
+    """memory-map a whole board saved as a 0/255 .npy array"""
+    # the .npy file is mapped copy-on-write: cells are only read from disk
+    # when they are used and the file itself is never changed. This is also
+    # the format of the snapshots saved by headless runs.
+    board = np.load(fileName, mmap_mode='c')
+    if board.ndim != 2:
+        raise ValueError('%s: a board must be a 2-D array' % fileName)
+    return board
+
+def readPattern(fileName):
+    """read a pattern or board file, choosing the format from its extension"""
+    ext = os.path.splitext(fileName)[1].lower()
+    if ext == '.rle':
+        return readRLE(fileName)
+    elif ext in ('.cells', '.txt'):
+        return readPlaintext(fileName)
+    elif ext == '.npy':
+        return readBoard(fileName)
+    raise ValueError('%s: unknown pattern format %r' % (fileName, ext))
+
+# values of the ON and OFF cells
+ON = 255
+OFF = 0
+
+def stepLoop(grid):
+    """reference engine: compute the next generation one cell at a time"""
+    rows, cols = grid.shape
+    # read from a 64-bit copy so sums of 255s cannot overflow narrow
+    # dtypes, and write into a copy since we require 8 neighbors for
+    # calculation and we go up by line
+    cells = np.asarray(grid, dtype=np.int64)
     newGrid = grid.copy()
-    for i in range(N):
-        for j in range(N):
+    for i in range(rows):
+        for j in range(cols):
             # compute 8-neighbor sum using toroidal boundary 
             # conditions - x and y wrap around so that the 
             # simulation takes place on a toroidal surface
@@ -61,10 +212,10 @@ def update(frameNum, img, grid, N):
             # neighbors, using % to account for toroidal boundary conditions. 
             # ON = 255, after total, divide by 255 to find the total number of 
             # ON cells and store as total.
-            total = int((grid[i, (j-1)%N] + grid[i, (j+1)%N] +
-                        grid[(i-1)%N, j] + grid[(i+1)%N, j] +
-                        grid[(i-1%N, (j-1)%N)] + grid[(i-1)%N, (j+1)%N] +
-                        grid[(i+1)%N, (j-1)%N] + grid[(i+1)%N, (j+1)%N]/255))
+            total = int((cells[i, (j-1)%cols] + cells[i, (j+1)%cols] +
+                         cells[(i-1)%rows, j] + cells[(i+1)%rows, j] +
+                         cells[(i-1)%rows, (j-1)%cols] + cells[(i-1)%rows, (j+1)%cols] +
+                         cells[(i+1)%rows, (j-1)%cols] + cells[(i+1)%rows, (j+1)%cols])/255)
             
             # apply Conway's rules. Any ON cell is turned OFF if it has fewer than
             # 2 or more than 3 neighbors that are ON. Else, the OFF cell is turned 
@@ -72,12 +223,792 @@ def update(frameNum, img, grid, N):
             # of grid. Once evaluated and updated, newGrid contains the data for 
             # the next steps. Can't change grid or the states of the cells would 
             # keep changing as you try to evaluate them
-            if grid[i, j] == ON:
+            if cells[i, j] == ON:
                 if (total < 2) or (total > 3):
-                    newGrid[i, j] = 0
-                else:
-                    if total == 3:
-                        newGrid[i, j] = 255
+                    newGrid[i, j] = OFF
+            else:
+                if total == 3:
+                    newGrid[i, j] = ON
+    return newGrid
+
+def stepNumpy(grid):
+    """vectorized engine: compute the next generation of the whole grid at once"""
+    alive = (grid == ON).astype(np.uint8)
+    # neighbor counts on the torus from shifted copies of the grid. np.roll
+    # wraps around the edges, which gives the toroidal boundary for free.
+    # Sum each cell with the cells above and below it first, then sum those
+    # column totals left and right, and take away the cell itself.
+    cols = alive + np.roll(alive, 1, axis=0) + np.roll(alive, -1, axis=0)
+    total = cols + np.roll(cols, 1, axis=1) + np.roll(cols, -1, axis=1) - alive
+    # apply Conway's rules as boolean masks: a cell is ON next generation
+    # if it has exactly 3 ON neighbors, or if it is ON and has exactly 2
+    born = total == 3
+    survives = (alive == 1) & (total == 2)
+    newGrid = np.full_like(grid, OFF)
+    newGrid[born | survives] = ON
+    return newGrid
+
+# number of 1 bits in each byte value, for counting the cells of a BitGrid
+# on NumPy older than 2.0, which has no np.bitwise_count
+BYTE_BITS = np.array([bin(b).count('1') for b in range(256)], dtype=np.uint8)
+
+class BitGrid:
+    """Game of Life grid that stores one bit per cell"""
+    # each row of the board is packed into 64-bit words, with cell j of a
+    # row stored in bit j%64 of word j//64. A 16k x 16k board takes 32 MB
+    # instead of the 2 GB of the 0/255 int64 array.
+    def __init__(self, rows, cols):
+        """create an empty (all OFF) board"""
+        self.rows = rows
+        self.cols = cols
+        self.nWords = (cols + 63) // 64
+        self.words = np.zeros((rows, self.nWords), dtype=np.uint64)
+        # mask of the cells actually used in the last word of each row.
+        # The padding bits past the last column are always kept at 0.
+        lastBits = cols - 64*(self.nWords - 1)
+        self.lastMask = np.uint64((1 << lastBits) - 1)
+
+    @classmethod
+    def fromArray(cls, grid, chunk=1024):
+        """pack a 0/255 grid into a new BitGrid"""
+        rows, cols = grid.shape
+        bits = cls(rows, cols)
+        # a few rows at a time, so memory-mapped boards are read in pieces
+        for i in range(0, rows, chunk):
+            bits.setRows(i, grid[i:i+chunk])
+        return bits
+
+    @classmethod
+    def random(cls, rows, cols, p=0.2, chunk=1024):
+        """random board with a fraction p of ON cells, built a few rows at a
+        time so the full 0/255 array never has to exist"""
+        bits = cls(rows, cols)
+        for i in range(0, rows, chunk):
+            n = min(chunk, rows - i)
+            block = np.random.choice([ON, OFF], n*cols, p=[p, 1 - p])
+            bits.setRows(i, block.reshape(n, cols))
+        return bits
+
+    def setRows(self, i, grid):
+        """pack the 0/255 rows of grid into this board starting at row i"""
+        # packbits gives 8 cells per byte, little end first, then the bytes
+        # are padded to whole words and read as little-endian uint64s
+        packed = np.packbits(grid == ON, axis=1, bitorder='little')
+        padded = np.zeros((grid.shape[0], 8*self.nWords), dtype=np.uint8)
+        padded[:, :packed.shape[1]] = packed
+        self.words[i:i+grid.shape[0]] = padded.view('<u8')
+
+    def toArray(self, dtype=np.uint8):
+        """unpack the board into a 0/255 grid for imshow and the pattern helpers"""
+        packed = self.words.astype('<u8').view(np.uint8)
+        alive = np.unpackbits(packed, axis=1, count=self.cols, bitorder='little')
+        grid = np.full((self.rows, self.cols), OFF, dtype=dtype)
+        grid[alive == 1] = ON
+        return grid
+
+    def population(self, blockRows=256):
+        """number of ON cells"""
+        # the bits are counted a word (or a byte) at a time, a block of
+        # rows at a time, so the temporaries stay a fraction of the board
+        # instead of the one byte per cell np.unpackbits would take
+        total = 0
+        for i in range(0, self.rows, blockRows):
+            block = self.words[i:i+blockRows]
+            if hasattr(np, 'bitwise_count'):
+                total += int(np.bitwise_count(block).sum(dtype=np.int64))
+            else:
+                total += int(BYTE_BITS[block.view(np.uint8)].sum(dtype=np.int64))
+        return total
+
+    def _west(self, w):
+        """words holding, at each cell, the value of its left neighbor"""
+        one = np.uint64(1)
+        # shift every row one cell towards the high bits, carrying the top
+        # bit of the previous word into bit 0 of the next
+        west = (w << one) | (np.roll(w, 1, axis=1) >> np.uint64(63))
+        # wrap the last column of the torus around into column 0
+        k, b = divmod(self.cols - 1, 64)
+        west[:, 0] = (west[:, 0] & ~one) | ((w[:, k] >> np.uint64(b)) & one)
+        return west
+
+    def _east(self, w):
+        """words holding, at each cell, the value of its right neighbor"""
+        one = np.uint64(1)
+        east = (w >> one) | (np.roll(w, -1, axis=1) << np.uint64(63))
+        # wrap column 0 of the torus around into the last column
+        k, b = divmod(self.cols - 1, 64)
+        bit = np.uint64(b)
+        east[:, k] = (east[:, k] & ~(one << bit)) | ((w[:, 0] & one) << bit)
+        return east
+
+    def _rowSum(self, w):
+        """2-bit sum of each cell and its left and right neighbors"""
+        a, b, c = self._west(w), w, self._east(w)
+        # full adder across the three shifted rows
+        return a ^ b ^ c, (a & b) | (c & (a ^ b))
+
+    def step(self):
+        """advance the board one generation with bitwise word operations"""
+        w = self.words
+        # 2-bit sums of the 3 cells in each row, then the rows above and below
+        m0, m1 = self._rowSum(w)
+        u0, u1 = np.roll(m0, 1, axis=0), np.roll(m1, 1, axis=0)
+        d0, d1 = np.roll(m0, -1, axis=0), np.roll(m1, -1, axis=0)
+        # add the three row sums to get the 3x3 block total s0 + 2*t, which
+        # includes the cell itself. Bit 0 and the carry out of bit 0:
+        s0 = u0 ^ m0 ^ d0
+        c0 = (u0 & m0) | (d0 & (u0 ^ m0))
+        # t is the count of the four bits u1, m1, d1, c0. Only t == 1 and
+        # t == 2 are needed, so count in pairs instead of a full adder.
+        p, q = u1 ^ m1, d1 ^ c0
+        pa, qa = u1 & m1, d1 & c0
+        t1 = (p ^ q) & ~(pa | qa)
+        t2 = (p & q) | (~(p | q) & (pa ^ qa))
+        # a 3x3 total of 3 turns the cell ON whatever its state, and a
+        # total of 4 keeps an ON cell ON - the same as Conway's rules
+        new = (s0 & t1) | (~s0 & t2 & w)
+        new[:, -1] &= self.lastMask
+        self.words = new
+        return self
+
+def stepBits(grid):
+    """bit-packed engine: pack the grid, step it with BitGrid and unpack it"""
+    return BitGrid.fromArray(grid).step().toArray(dtype=grid.dtype)
+
+# named Life-like rules accepted by --rule, in B/S notation: a dead cell
+# is born with any of the B neighbor counts, and a live cell survives with
+# any of the S counts
+RULES = {'conway': 'B3/S23',
+         'highlife': 'B36/S23',
+         'seeds': 'B2/S',
+         'daynight': 'B3678/S34678',
+         'lifewithoutdeath': 'B3/S012345678',
+         'maze': 'B3/S12345'}
+
+def parseRule(rule):
+    """birth and survival neighbor counts of a rule like 'B36/S23'"""
+    # accepts B/S ('B36/S23', 'b36s23'), S/B ('S23/B36') and the older
+    # survival/birth digits-only notation ('23/36')
+    text = rule.strip().upper()
+    m = re.fullmatch(r'B([0-8]*)/?S([0-8]*)', text)
+    if m:
+        births, survivals = m.groups()
+    else:
+        m = (re.fullmatch(r'S([0-8]*)/?B([0-8]*)', text) or
+             re.fullmatch(r'([0-8]*)/([0-8]*)', text))
+        if not m:
+            raise ValueError('bad rule %r, expected B/S notation like '
+                             '"B3/S23"' % rule)
+        survivals, births = m.groups()
+    return frozenset(map(int, births)), frozenset(map(int, survivals))
+
+class LifeRule:
+    """engine for any Life-like rule, driven by a 512-entry lookup table"""
+    # Each cell and its 8 neighbors make a 9-bit number, with the cell
+    # itself in bit 4. The table holds the next state for every one of the
+    # 512 neighborhoods, so a step is building those numbers for the whole
+    # grid and a single table lookup.
+    def __init__(self, rule='B3/S23'):
+        self.births, self.survivals = parseRule(RULES.get(rule.lower(), rule))
+        self.table = np.zeros(512, dtype=bool)
+        for index in range(512):
+            center = (index >> 4) & 1
+            total = bin(index).count('1') - center
+            if center:
+                self.table[index] = total in self.survivals
+            else:
+                self.table[index] = total in self.births
+
+    def __str__(self):
+        return 'B%s/S%s' % (''.join(map(str, sorted(self.births))),
+                            ''.join(map(str, sorted(self.survivals))))
+
+    def isConway(self):
+        """True for Conway's B3/S23 rule, which every engine can run"""
+        return self.births == {3} and self.survivals == {2, 3}
+
+    def __call__(self, grid):
+        """next generation of grid under this rule"""
+        alive = (grid == ON).astype(np.uint16)
+        # 3-bit code of each cell's column: above, itself, below
+        col = (np.roll(alive, 1, axis=0) | (alive << 1) |
+               (np.roll(alive, -1, axis=0) << 2))
+        # 9-bit code of the 3x3 neighborhood: left, center, right columns
+        index = (np.roll(col, 1, axis=1) | (col << 3) |
+                 (np.roll(col, -1, axis=1) << 6))
+        newGrid = np.full_like(grid, OFF)
+        newGrid[self.table[index]] = ON
+        return newGrid
+
+def stepBlock(block):
+    """next generation of the interior of a block that carries a 1-cell border"""
+    # same sums as stepNumpy, but over slices instead of np.roll, so the
+    # border cells are read as neighbors and not wrapped around
+    alive = (block == ON).astype(np.uint8)
+    cols = alive[:-2] + alive[1:-1] + alive[2:]
+    total = cols[:, :-2] + cols[:, 1:-1] + cols[:, 2:] - alive[1:-1, 1:-1]
+    newAlive = (total == 3) | ((alive[1:-1, 1:-1] == 1) & (total == 2))
+    newBlock = np.full_like(block[1:-1, 1:-1], OFF)
+    newBlock[newAlive] = ON
+    return newBlock
+
+class TileScheduler:
+    """engine that only recomputes the tiles of the grid that can change"""
+    # A cell can only change if it or one of its neighbors changed in the
+    # last generation. So a tile only needs recomputing if it changed last
+    # generation or borders a tile that did; every other tile is copied.
+    # Mostly empty boards like --glider and --gosper end up recomputing a
+    # handful of tiles per frame.
+    # The grid returned is one of two buffers the scheduler owns, and the
+    # next generation is written into the other one. Tiles that are not
+    # recomputed did not change in the last generation either, so the
+    # other buffer already holds them and nothing else is copied. Pass the
+    # grid returned last time back in to keep this going: any other grid,
+    # or one edited in place after reset(), starts over with every tile.
+    def __init__(self, tileSize=32, verbose=False):
+        self.tileSize = tileSize
+        self.verbose = verbose
+        # per-frame count of recomputed tiles
+        self.activeCounts = []
+        self.nTiles = 0
+        self.reset()
+
+    def reset(self):
+        """forget the changed tiles, so the next step recomputes every tile"""
+        self.last = None
+        self.spare = None
+        self.changed = None
+
+    def __call__(self, grid):
+        """compute the next generation, recomputing only the active tiles"""
+        rows, cols = grid.shape
+        T = self.tileSize
+        nty, ntx = (rows + T - 1) // T, (cols + T - 1) // T
+        self.nTiles = nty*ntx
+        # start over with every tile active when given a grid other than
+        # the one returned last time, e.g. a new board, which is then
+        # copied since it is not ours to write the generation after into
+        restart = grid is not self.last
+        if restart:
+            active = np.ones((nty, ntx), dtype=bool)
+            self.spare = np.empty_like(grid)
+        else:
+            # changed tiles and their 8 neighbors, wrapping around the torus
+            c = self.changed
+            rowsMask = c | np.roll(c, 1, axis=0) | np.roll(c, -1, axis=0)
+            active = (rowsMask | np.roll(rowsMask, 1, axis=1) |
+                      np.roll(rowsMask, -1, axis=1))
+        newGrid = self.spare
+        changed = np.zeros((nty, ntx), dtype=bool)
+        for ty, tx in zip(*np.nonzero(active)):
+            i0, j0 = ty*T, tx*T
+            i1, j1 = min(i0 + T, rows), min(j0 + T, cols)
+            # tile plus a 1-cell border, with toroidal wrap at the edges
+            ri = np.arange(i0 - 1, i1 + 1) % rows
+            ci = np.arange(j0 - 1, j1 + 1) % cols
+            tile = stepBlock(grid[np.ix_(ri, ci)])
+            # written even if unchanged, since the buffer holds the tile
+            # of the generation before
+            newGrid[i0:i1, j0:j1] = tile
+            changed[ty, tx] = not np.array_equal(tile, grid[i0:i1, j0:j1])
+        self.changed = changed
+        self.spare = grid.copy() if restart else grid
+        self.last = newGrid
+        nActive = int(active.sum())
+        self.activeCounts.append(nActive)
+        if self.verbose:
+            print('frame %d: %d of %d tiles active' %
+                  (len(self.activeCounts), nActive, self.nTiles))
+        return newGrid
+
+# shared memory blocks attached by each worker process, by name
+gShared = {}
+
+def _attach(name, shape):
+    """view of a shared memory block as a grid, attaching it on first use"""
+    if name not in gShared:
+        gShared[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=np.uint8, buffer=gShared[name].buf)
+
+def _stepBand(task):
+    """worker: step rows r0 to r1 of the source grid into the destination"""
+    srcName, dstName, shape, r0, r1 = task
+    src = _attach(srcName, shape)
+    dst = _attach(dstName, shape)
+    rows = shape[0]
+    # the band plus a one-row halo above and below, read straight from the
+    # shared source grid, wrapping around the top and bottom of the torus
+    block = src[np.arange(r0 - 1, r1 + 1) % rows]
+    alive = (block == ON).astype(np.uint8)
+    # same sums as stepNumpy, with slices across rows since the halo is
+    # already there and np.roll across columns for the left/right wrap
+    cols = alive[:-2] + alive[1:-1] + alive[2:]
+    total = cols + np.roll(cols, 1, axis=1) + np.roll(cols, -1, axis=1) - alive[1:-1]
+    newAlive = (total == 3) | ((alive[1:-1] == 1) & (total == 2))
+    dst[r0:r1] = np.where(newAlive, ON, OFF)
+
+class ParallelStepper:
+    """engine that steps row bands of the grid in a pool of worker processes"""
+    # The grid lives in two shared memory buffers. Each generation, every
+    # worker reads its band and one halo row on each side from one buffer
+    # and writes the band into the other, then the buffers swap. Nothing
+    # is copied between processes; load() and toArray() are the only
+    # copies in and out of the shared grid.
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.buffers = []
+        self.shape = None
+
+    def load(self, grid):
+        """copy a 0/255 grid into shared memory, allocating it on first use"""
+        if grid.shape != self.shape:
+            self.close()
+            self.shape = grid.shape
+            size = max(grid.size, 1)
+            self.buffers = [shared_memory.SharedMemory(create=True, size=size)
+                            for i in range(2)]
+            rows = grid.shape[0]
+            bounds = np.linspace(0, rows, min(self.workers, rows) + 1).astype(int)
+            self.bands = list(zip(bounds[:-1], bounds[1:]))
+            self.pool = multiprocessing.Pool(self.workers)
+        self.current = 0
+        self.grid()[:] = np.where(grid == ON, ON, OFF)
+
+    def grid(self):
+        """view of the current generation in shared memory"""
+        buf = self.buffers[self.current].buf
+        return np.ndarray(self.shape, dtype=np.uint8, buffer=buf)
+
+    def step(self):
+        """advance the shared grid one generation"""
+        src = self.buffers[self.current].name
+        dst = self.buffers[1 - self.current].name
+        self.pool.map(_stepBand, [(src, dst, self.shape, r0, r1)
+                                  for r0, r1 in self.bands])
+        self.current = 1 - self.current
+        return self
+
+    def population(self):
+        """number of ON cells"""
+        return int((self.grid() == ON).sum())
+
+    def toArray(self, dtype=np.uint8):
+        """copy of the current generation as a 0/255 grid"""
+        return self.grid().astype(dtype)
+
+    def __call__(self, grid):
+        """engine interface: next generation of grid, as a new array"""
+        self.load(grid)
+        return self.step().toArray(dtype=grid.dtype)
+
+    def close(self):
+        """stop the workers and free the shared memory"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+        for shm in self.buffers:
+            shm.close()
+            shm.unlink()
+        self.buffers = []
+        self.shape = None
+
+    def __del__(self):
+        self.close()
+
+# the parallel engine's stepper, started on first use
+gParallel = None
+
+def stepParallel(grid):
+    """parallel engine: step the grid in bands with a shared process pool"""
+    global gParallel
+    if gParallel is None:
+        gParallel = ParallelStepper()
+    return gParallel(grid)
+
+# step engines selectable with --engine. Each takes the current grid and
+# returns the next generation as a new array of the same shape and dtype.
+ENGINES = {'loop': stepLoop, 'numpy': stepNumpy, 'bits': stepBits,
+           'tiles': TileScheduler(), 'parallel': stepParallel,
+           'lut': LifeRule()}
+
+def checkEngines(N=64, trials=5, generations=4):
+    """check every engine against the reference loop on random grids"""
+    ok = True
+    for trial in range(trials):
+        grid = randomGrid(N)
+        for name, step in ENGINES.items():
+            if step is stepLoop:
+                continue
+            # through a Runner, as the headless runs and the animation of
+            # the bits and parallel engines step them, with the board kept
+            # in the engine's own format between generations
+            expected = grid
+            runner = Runner(grid, name)
+            for gen in range(generations):
+                expected = stepLoop(expected)
+                runner.step()
+                if not np.array_equal(expected, runner.view()):
+                    print('%s engine differs from loop engine: trial %d, '
+                          'generation %d' % (name, trial, gen + 1))
+                    ok = False
+                    break
+            runner.close()
+    if ok:
+        print('all engines match the loop engine')
+    return ok
+
+class CycleDetector:
+    """detects when the board returns to an earlier state"""
+    # Each board gets a 64-bit Zobrist-style hash: the XOR of a random key
+    # for every ON cell. When cells change, XOR-ing the keys of just those
+    # cells updates the hash, so it is never recomputed from scratch. The
+    # hashes of the last maxHistory generations are kept, so still lifes
+    # (period 1) and oscillators up to that period are found.
+    def __init__(self, maxHistory=1024, seed=0):
+        self.maxHistory = maxHistory
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        """forget the history, e.g. before checking a new board"""
+        self.shape = None
+        self.hash = None
+        self.alive = None
+        # hash -> generation, oldest first
+        self.history = OrderedDict()
+        self.generation = 0
+        # generation the cycle started at and its period, once found
+        self.start = None
+        self.period = None
+
+    def _keys(self, i, j):
+        """random 64-bit keys of the cells (i, j)"""
+        # keys are mixed from one random value per row and per column, so
+        # large boards don't need a table of N*N keys
+        k = self.rowKeys[i] * self.colKeys[j]
+        k ^= k >> np.uint64(29)
+        k *= np.uint64(0xbf58476d1ce4e5b9)
+        k ^= k >> np.uint64(32)
+        return k
+
+    def check(self, grid):
+        """hash the next generation; True once it repeats an earlier one"""
+        alive = grid == ON
+        if alive.shape != self.shape:
+            rng = np.random.default_rng(self.seed)
+            top = np.iinfo(np.uint64).max
+            self.rowKeys = rng.integers(0, top, alive.shape[0], dtype=np.uint64) | np.uint64(1)
+            self.colKeys = rng.integers(0, top, alive.shape[1], dtype=np.uint64) | np.uint64(1)
+            self.shape = alive.shape
+            changed = alive
+            h = np.uint64(0)
+        else:
+            changed = alive != self.alive
+            h = self.hash
+        i, j = np.nonzero(changed)
+        self.hash = h ^ np.bitwise_xor.reduce(self._keys(i, j))
+        self.alive = alive
+        gen = self.generation
+        self.generation += 1
+        key = int(self.hash)
+        if key in self.history:
+            self.start = self.history[key]
+            self.period = gen - self.start
+            return True
+        self.history[key] = gen
+        if len(self.history) > self.maxHistory:
+            self.history.popitem(last=False)
+        return False
+
+class CycleStepper:
+    """engine that stops computing once the board cycles and replays the cycle"""
+    def __init__(self, step, maxHistory=1024, verbose=False):
+        self.step = step
+        self.verbose = verbose
+        self.detector = CycleDetector(maxHistory)
+        self.reset()
+
+    def reset(self):
+        """start over with a new board"""
+        self.detector.reset()
+        self.cycle = None
+        self.pos = 0
+
+    @property
+    def period(self):
+        """period of the detected cycle, 1 for a still life, or None"""
+        return self.detector.period
+
+    @property
+    def start(self):
+        """generation the detected cycle started at, or None"""
+        return self.detector.start
+
+    def __call__(self, grid):
+        """next generation, from the engine or from the cached cycle"""
+        if self.cycle is not None:
+            self.pos = (self.pos + 1) % len(self.cycle)
+            return self.cycle[self.pos].copy()
+        if self.detector.generation == 0:
+            self.detector.check(grid)
+        newGrid = self.step(grid)
+        if self.detector.check(newGrid):
+            # cache one period of frames, starting with this one
+            self.cycle = [newGrid.copy()]
+            g = newGrid
+            for i in range(self.period - 1):
+                g = self.step(g)
+                self.cycle.append(g.copy())
+            if self.verbose:
+                print('period %d cycle from generation %d' %
+                      (self.period, self.start))
+        return newGrid
+
+class Runner:
+    """one board stepped by one engine, kept in that engine's own format"""
+    # The bits and parallel engines keep their own board between
+    # generations and only copy it out when asked; hashlife keeps a quadtree
+    # of the infinite plane; the other engines step the 0/255 grid.
+    def __init__(self, grid, engine, tileSize=32, workers=None, rule='B3/S23',
+                 verbose=False):
+        self.engine = engine
+        self.board = None
+        self.grid = None
+        if engine == 'bits':
+            self.board = BitGrid.fromArray(grid)
+        elif engine == 'parallel':
+            self.board = ParallelStepper(workers)
+            self.board.load(grid)
+        elif engine == 'hashlife':
+            self.board = hashlife.Hashlife()
+            self.board.load(grid)
+        else:
+            self.grid = grid
+            self.stepper = ENGINES[engine]
+            if engine == 'tiles':
+                self.stepper = TileScheduler(tileSize, verbose)
+            elif engine == 'lut':
+                self.stepper = LifeRule(rule)
+
+    def step(self):
+        """advance one generation"""
+        if self.engine == 'hashlife':
+            self.board.advance(1)
+        elif self.board is not None:
+            self.board.step()
+        else:
+            self.grid = self.stepper(self.grid)
+
+    def population(self):
+        """number of ON cells"""
+        if self.board is not None:
+            return self.board.population()
+        return int((self.grid == ON).sum())
+
+    def toArray(self):
+        """copy of the board as a 0/255 uint8 grid"""
+        if self.board is not None:
+            return self.board.toArray()
+        return self.grid.astype(np.uint8)
+
+    def view(self):
+        """the board as a 0/255 grid, without a copy where possible"""
+        if self.engine == 'parallel':
+            return self.board.grid()
+        elif self.board is not None:
+            return self.board.toArray()
+        return self.grid
+
+    def close(self):
+        """free the worker processes of the parallel engine"""
+        if self.engine == 'parallel':
+            self.board.close()
+
+def runHeadless(grid, engine, generations, outDir, every=100, tileSize=32,
+                workers=None, detectCycles=False, maxHistory=1024,
+                rule='B3/S23'):
+    """run the simulation without display, saving snapshots and populations"""
+    os.makedirs(outDir, exist_ok=True)
+    runner = Runner(grid, engine, tileSize, workers, rule)
+    detector = CycleDetector(maxHistory) if detectCycles else None
+    popFile = open(os.path.join(outDir, 'population.csv'), 'w')
+    # the tiles engine also records how many tiles it recomputed for each
+    # generation, none for the starting one
+    tiles = engine == 'tiles'
+    popFile.write('generation,population' + (',active_tiles' if tiles else '') + '\n')
+    start = time.perf_counter()
+    for gen in range(generations + 1):
+        if gen > 0:
+            runner.step()
+        # population of every generation, and a snapshot every few
+        popFile.write('%d,%d' % (gen, runner.population()))
+        if tiles:
+            popFile.write(',%d' % (runner.stepper.activeCounts[-1] if gen else 0))
+        popFile.write('\n')
+        if every and gen % every == 0:
+            np.save(os.path.join(outDir, 'gen%08d.npy' % gen), runner.toArray())
+        # nothing new happens after the board cycles, so stop there
+        if detector is not None and detector.check(runner.view()):
+            print('period %d cycle from generation %d' %
+                  (detector.period, detector.start))
+            break
+    popFile.close()
+    runner.close()
+    elapsed = time.perf_counter() - start
+    print('%d generations in %.2f s (%.1f generations/s)' %
+          (gen, elapsed, gen/max(elapsed, 1e-9)))
+    return detector
+
+def exportRun(grid, engine, generations, fileName, every=1, scale=1, delay=5,
+              tileSize=32, workers=None, rule='B3/S23'):
+    """stream every k-th generation to a GIF (.gif) or raw video file"""
+    runner = Runner(grid, engine, tileSize, workers, rule)
+    writer = conway_export.openWriter(fileName, grid.shape, scale, delay)
+    start = time.perf_counter()
+    for gen in range(generations + 1):
+        if gen > 0:
+            runner.step()
+        if gen % every == 0:
+            writer.write(runner.view())
+    writer.close()
+    runner.close()
+    elapsed = time.perf_counter() - start
+    print('%d frames of %d x %d written to %s in %.2f s' %
+          (writer.frames, writer.buffer.width, writer.buffer.height,
+           fileName, elapsed), file=sys.stderr)
+
+class SimulationThread(threading.Thread):
+    """steps the grid as fast as the engine allows, apart from the display"""
+    # the display only ever picks up the latest generation, so when drawing
+    # is slower than the engine the frames in between are dropped
+    # step is an engine, or a Runner whose board stays in its own format;
+    # a Runner's board is then only copied out when the display asks
+    def __init__(self, grid, step):
+        super().__init__(daemon=True)
+        self.grid = grid
+        self.step = step
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.running = True
+
+    def run(self):
+        grid = self.grid
+        while self.running:
+            if isinstance(self.step, Runner):
+                with self.lock:
+                    self.step.step()
+                    self.generation += 1
+                continue
+            grid = self.step(grid)
+            with self.lock:
+                self.grid = grid
+                self.generation += 1
+
+    def latest(self):
+        """the latest generation number and grid"""
+        with self.lock:
+            if isinstance(self.step, Runner):
+                return self.generation, self.step.toArray()
+            # a copy, since the tiles engine writes the generation after
+            # next into the grid it returned
+            return self.generation, self.grid.copy()
+
+    def stop(self):
+        self.running = False
+
+def downsample(grid, factor):
+    """0/255 grid with one cell per factor x factor block, ON if any cell is ON"""
+    if factor == 1:
+        return grid
+    rows, cols = grid.shape
+    alive = np.zeros((-(-rows//factor)*factor, -(-cols//factor)*factor), dtype=bool)
+    alive[:rows, :cols] = grid == ON
+    blocks = alive.reshape(alive.shape[0]//factor, factor,
+                           alive.shape[1]//factor, factor)
+    return np.where(blocks.any(axis=(1, 3)), ON, OFF).astype(np.uint8)
+
+class BlitView:
+    """draws the grid as a mosaic of image tiles, redrawing only changed tiles"""
+    # Instead of one image for the whole grid, each tile of the view is its
+    # own small image. Every frame only the tiles whose cells changed are
+    # drawn again and blitted to the screen; the rest stay as they are.
+    def __init__(self, ax, shape, tileSize=64):
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        self.tileSize = tileSize
+        self.frame = np.zeros(shape, dtype=np.uint8)
+        rows, cols = shape
+        T = tileSize
+        self.tiles = []
+        for i0 in range(0, rows, T):
+            for j0 in range(0, cols, T):
+                i1, j1 = min(i0 + T, rows), min(j0 + T, cols)
+                # fixed color limits, since a tile may start all OFF
+                img = ax.imshow(self.frame[i0:i1, j0:j1], interpolation='nearest',
+                                vmin=OFF, vmax=ON,
+                                extent=(j0 - 0.5, j1 - 0.5, i1 - 0.5, i0 - 0.5))
+                self.tiles.append((i0, i1, j0, j1, img))
+        ax.set_xlim(-0.5, cols - 0.5)
+        ax.set_ylim(rows - 0.5, -0.5)
+
+    def show(self, frame):
+        """draw frame, updating and blitting only the tiles that changed"""
+        changed = []
+        for i0, i1, j0, j1, img in self.tiles:
+            tile = frame[i0:i1, j0:j1]
+            if not np.array_equal(tile, self.frame[i0:i1, j0:j1]):
+                self.frame[i0:i1, j0:j1] = tile
+                img.set_data(self.frame[i0:i1, j0:j1])
+                changed.append(img)
+        if not changed:
+            return 0
+        if self.canvas.supports_blit:
+            for img in changed:
+                self.ax.draw_artist(img)
+                self.canvas.blit(img.get_window_extent())
+        else:
+            self.canvas.draw_idle()
+        return len(changed)
+
+def runBlitted(grid, step, interval=50, tileSize=64):
+    """show the simulation with BlitView while SimulationThread steps it"""
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    # one view cell per screen pixel at most: when the grid is larger than
+    # the axes, show a max-pooled grid instead of uploading every cell
+    fig.canvas.draw()
+    box = ax.get_window_extent()
+    screen = max(1, int(min(box.width, box.height)))
+    factor = max(1, -(-max(grid.shape)//screen))
+    view = BlitView(ax, downsample(grid, factor).shape, tileSize)
+    fig.canvas.draw()
+    sim = SimulationThread(grid, step)
+    state = {'shown': -1}
+
+    def redraw():
+        gen, latest = sim.latest()
+        if gen == state['shown']:
+            return
+        nTiles = view.show(downsample(latest, factor))
+        if fig.canvas.manager is not None:
+            fig.canvas.manager.set_window_title(
+                'generation %d, %d frames dropped, %d tiles redrawn' %
+                (gen, max(gen - state['shown'] - 1, 0), nTiles))
+        state['shown'] = gen
+
+    timer = fig.canvas.new_timer(interval=interval)
+    timer.add_callback(redraw)
+    view.show(downsample(grid, factor))
+    sim.start()
+    timer.start()
+    plt.show()
+    sim.stop()
+    return sim
+
+def update(frameNum, img, grid, N, step=stepNumpy):
+    # compute the next generation with the chosen step engine
+    newGrid = step(grid)
     # update data
     img.set_data(newGrid)
     grid[:] = newGrid[:]
@@ -85,6 +1016,14 @@ def update(frameNum, img, grid, N):
     # function needs to return an iterable
     return img,
 
+def updateRunner(frameNum, img, runner):
+    """update() for engines that keep their own board in a Runner"""
+    # the board is stepped where it lives, and the image is handed a view
+    # of it, so the grid is not copied in and out every generation
+    runner.step()
+    img.set_data(runner.view())
+    return img,
+
 def main():
     # command line arguments are in sys.argv[1], sys.argv[2], ...
     # sys.argsv[0] is the script name and can be ignored
@@ -98,8 +1037,75 @@ def main():
     # start simulation with a glider pattern else the ON/OFF is random
     parser.add_argument('--glider', action='store_true', required=False)
     parser.add_argument('--gosper', action='store_true', required=False)
+    parser.add_argument('--rpentomino', action='store_true', required=False)
+    # start from a pattern file: .rle, .cells or a whole .npy board
+    parser.add_argument('--pattern-file', dest='patternFile', required=False)
+    # choose how each generation is computed. hashlife runs on an infinite
+    # plane instead of wrapping around, for --headless and --export runs
+    parser.add_argument('--engine', dest='engine',
+                        choices=sorted(list(ENGINES) + ['hashlife']),
+                        default='numpy', required=False)
+    # jump the starting pattern this many generations ahead with Hashlife
+    parser.add_argument('--generations', dest='generations', type=int,
+                        required=False)
+    # tile size for the tiles engine, which prints its active tiles per frame
+    parser.add_argument('--tile-size', dest='tileSize', type=int, default=32,
+                        required=False)
+    # run this many generations without display, saving to --out
+    parser.add_argument('--headless', dest='headless', type=int,
+                        required=False)
+    parser.add_argument('--out', dest='out', default='conway_out',
+                        required=False)
+    # save a snapshot every this many generations in headless runs
+    parser.add_argument('--snapshot-every', dest='every', type=int,
+                        default=100, required=False)
+    # write this many generations to a .gif or raw video file (- for
+    # stdout) instead of showing them, every k-th generation, each cell
+    # drawn as a scale x scale block
+    parser.add_argument('--export', dest='export', required=False)
+    parser.add_argument('--export-generations', dest='exportGenerations',
+                        type=int, default=100, required=False)
+    parser.add_argument('--export-every', dest='exportEvery', type=int,
+                        default=1, required=False)
+    parser.add_argument('--export-scale', dest='exportScale', type=int,
+                        default=4, required=False)
+    # number of worker processes for the parallel engine
+    parser.add_argument('--workers', dest='workers', type=int, required=False)
+    # stop (headless) or replay the cached cycle (animation) once the board
+    # repeats one of the last --history generations
+    parser.add_argument('--detect-cycles', dest='detectCycles',
+                        action='store_true', required=False)
+    parser.add_argument('--history', dest='history', type=int, default=1024,
+                        required=False)
+    # Life-like rule in B/S notation, like B36/S23, or a name from RULES.
+    # Rules other than Conway's run on the lookup table (lut) engine.
+    parser.add_argument('--rule', dest='rule', default='B3/S23',
+                        required=False)
+    # draw with blitted image tiles, redrawing only the changed ones, while
+    # a separate thread steps the simulation as fast as it can
+    parser.add_argument('--blit', action='store_true', required=False)
+    parser.add_argument('--display-tile', dest='displayTile', type=int,
+                        default=64, required=False)
+    # compare the engines against each other on random grids and exit
+    parser.add_argument('--check', action='store_true', required=False)
     args = parser.parse_args()
 
+    if args.check:
+        sys.exit(0 if checkEngines() else 1)
+
+    try:
+        rule = LifeRule(args.rule)
+    except ValueError as err:
+        parser.error(str(err))
+    if not rule.isConway():
+        # the other engines only know Conway's rules
+        if args.engine not in ('numpy', 'lut'):
+            parser.error('the %s engine only runs B3/S23, use --engine lut '
+                         'for %s' % (args.engine, rule))
+        if args.generations:
+            parser.error('--generations only runs B3/S23')
+        args.engine = 'lut'
+
     # set grid
     N = 100
 
@@ -114,12 +1120,32 @@ def main():
     # set the initial condition to match a particular pattern, zero
     # out the grid first. Create an N by N array of zeros
     # grid = np.zeros(N*N).reshape(N, N)
-    if args.glider:
+    if args.patternFile:
+        try:
+            pattern = readPattern(args.patternFile)
+        except (ValueError, OSError) as err:
+            parser.error(str(err))
+        if args.patternFile.lower().endswith('.npy'):
+            # a board file is the whole grid
+            grid = pattern
+        else:
+            # place the pattern in the middle of the grid, growing the grid
+            # if the pattern does not fit with some room around it
+            if args.N and int(args.N) > 8:
+                N = int(args.N)
+            N = max(N, int(1.2*max(pattern.shape)) + 2)
+            grid = np.zeros(N*N, dtype=np.uint8).reshape(N, N)
+            rows, cols = pattern.shape
+            addPattern((N - rows)//2, (N - cols)//2, pattern, grid)
+    elif args.glider:
         grid = np.zeros(N*N).reshape(N, N)
         addGlider(1, 1, grid)
     elif args.gosper:
         grid = np.zeros(N*N).reshape(N, N)
         addGosperGliderGun(10, 10, grid)
+    elif args.rpentomino:
+        grid = np.zeros(N*N).reshape(N, N)
+        addRPentomino(N//2, N//2, grid)
     else:
         # set N if specified and valid
         if args.N and int(args.N) > 8:
@@ -127,14 +1153,80 @@ def main():
         # populate grid with random on/off - more off than on
         grid = randomGrid(N)
 
+    # jump ahead before the animation starts. Hashlife runs on an infinite
+    # plane, so cells that leave the grid are lost instead of wrapping
+    # around as they do in update()
+    if args.generations:
+        life = hashlife.Hashlife()
+        life.load(grid)
+        life.advance(args.generations)
+        grid = life.toArray(dtype=grid.dtype)
+        print('generation %d: %d cells alive, %d in view' %
+              (life.generation, life.population(), (grid == ON).sum()))
+
+    if args.export:
+        exportRun(grid, args.engine, args.exportGenerations, args.export,
+                  every=args.exportEvery, scale=args.exportScale,
+                  delay=max(updateInterval//10, 1), tileSize=args.tileSize,
+                  workers=args.workers, rule=args.rule)
+        return
+
+    if args.headless is not None:
+        runHeadless(grid, args.engine, args.headless, args.out,
+                    every=args.every, tileSize=args.tileSize,
+                    workers=args.workers, detectCycles=args.detectCycles,
+                    maxHistory=args.history, rule=args.rule)
+        return
+
+    # the display steps one generation per frame, where hashlife has
+    # nothing to gain, and update() expects the wrapped grid
+    if args.engine == 'hashlife':
+        parser.error('the hashlife engine only runs with --headless or '
+                     '--export, use --generations to jump ahead before '
+                     'the animation')
+
+    # the bits and parallel engines keep their board resident in a Runner
+    # between frames, and the tiles engine its two buffers, which update()
+    # would copy over. Cycle detection needs every grid, so it steps copies.
+    runner = None
+    if args.engine in ('bits', 'parallel', 'tiles') and not args.detectCycles:
+        runner = Runner(grid, args.engine, args.tileSize, args.workers,
+                        verbose=True)
+    step = ENGINES[args.engine]
+    if args.engine == 'tiles':
+        step = TileScheduler(args.tileSize, verbose=True)
+    elif args.engine == 'parallel' and runner is None:
+        step = ParallelStepper(args.workers)
+    elif args.engine == 'lut':
+        step = rule
+    if args.detectCycles:
+        step = CycleStepper(step, args.history, verbose=True)
+
+    if args.blit:
+        runBlitted(grid, runner or step, updateInterval, args.displayTile)
+        return
+
+    # only now load matplotlib, since the animation needs it
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
     # set up the animation
     fig, ax = plt.subplots()
     # Interpolation as 'nearest' to have sharp edges between squares.
     img = ax.imshow(grid, interpolation='nearest')
-    ani = animation.FuncAnimation(fig, update, fargs=(img, grid, N, ),
-                                frames = 10,
-                                interval=updateInterval)
+    if runner is not None:
+        ani = animation.FuncAnimation(fig, updateRunner,
+                                      fargs=(img, runner, ),
+                                      frames = 10,
+                                      interval=updateInterval)
+    else:
+        ani = animation.FuncAnimation(fig, update,
+                                    fargs=(img, grid, N, step, ),
+                                    frames = 10,
+                                    interval=updateInterval)
     plt.show()
+    if runner is not None:
+        runner.close()
 
 # call main function
 if __name__ == '__main__':
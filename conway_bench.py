@@ -0,0 +1,170 @@
+"""
+conway_bench.py
+
+Correctness and speed checks for the Game of Life engines in conway.py.
+
+Every engine must pass the golden suite of known patterns before its
+timings are worth anything, so the suite runs first.
+"""
+
+# run with:
+# python conway_bench.py                      golden suite, then all timings
+# python conway_bench.py --golden-only        just the golden suite
+# python conway_bench.py --engines numpy,bits --sizes 64,1024 --csv out.csv
+
+import sys, time, argparse
+import numpy as np
+import conway
+from conway import ON, OFF
+
+# every engine the suite and benchmark run, including hashlife, which
+# steps a quadtree of the infinite plane instead of a grid
+ALL_ENGINES = sorted(conway.ENGINES) + ['hashlife']
+
+# grid sizes from 64^2 to 8192^2 cells and fractions of cells ON
+SIZES = [64, 128, 256, 512, 1024, 2048, 4096, 8192]
+DENSITIES = [0.1, 0.2, 0.5]
+
+
+def runPattern(engine, grid, generations):
+    """list of the 0/255 grids for generations 0 to generations"""
+    runner = conway.Runner(grid, engine)
+    frames = [runner.toArray()]
+    for gen in range(generations):
+        runner.step()
+        frames.append(runner.toArray())
+    runner.close()
+    return frames
+
+
+def goldenGlider(engine):
+    """a glider moves one cell down and one right every 4 generations"""
+    grid = np.zeros((16, 16), dtype=np.uint8)
+    conway.addGlider(1, 1, grid)
+    frames = runPattern(engine, grid, 8)
+    for k in (1, 2):
+        expected = np.roll(np.roll(grid, k, axis=0), k, axis=1)
+        if not np.array_equal(frames[4*k], expected):
+            return 'glider not displaced by (%d, %d) at generation %d' % (k, k, 4*k)
+    return None
+
+
+def goldenBlinker(engine):
+    """a blinker flips between a row and a column with period 2"""
+    grid = np.zeros((8, 8), dtype=np.uint8)
+    grid[4, 3:6] = ON
+    frames = runPattern(engine, grid, 4)
+    column = np.zeros((8, 8), dtype=np.uint8)
+    column[3:6, 4] = ON
+    if not np.array_equal(frames[1], column):
+        return 'blinker did not turn into a column'
+    if not (np.array_equal(frames[2], grid) and np.array_equal(frames[4], grid)):
+        return 'blinker does not have period 2'
+    return None
+
+
+def goldenGosper(engine):
+    """a Gosper gun starts with 36 cells and adds a 5-cell glider every 30"""
+    grid = np.zeros((100, 100), dtype=np.uint8)
+    conway.addGosperGliderGun(10, 10, grid)
+    frames = runPattern(engine, grid, 120)
+    for gen, expected in ((0, 36), (30, 41), (60, 46), (120, 56)):
+        pop = int((frames[gen] == ON).sum())
+        if pop != expected:
+            return 'Gosper gun has %d cells at generation %d, expected %d' % (
+                pop, gen, expected)
+    return None
+
+
+GOLDEN = [goldenGlider, goldenBlinker, goldenGosper]
+
+
+def runGolden(engines):
+    """run the golden suite on each engine, returning the failures"""
+    failures = []
+    for engine in engines:
+        for test in GOLDEN:
+            error = test(engine)
+            status = 'ok' if error is None else 'FAIL: ' + error
+            print('%-10s %-14s %s' % (engine, test.__name__, status))
+            if error is not None:
+                failures.append((engine, test.__name__, error))
+    return failures
+
+
+def benchEngine(engine, N, density, seconds=1.0, maxGenerations=1000):
+    """generations/s and cells/s of one engine on a random N x N grid"""
+    grid = np.where(np.random.random((N, N)) < density, ON, OFF).astype(np.uint8)
+    runner = conway.Runner(grid, engine)
+    # one untimed step, so the first generation's setup is not counted
+    runner.step()
+    gens = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while gens < maxGenerations and elapsed < seconds:
+        runner.step()
+        gens += 1
+        elapsed = time.perf_counter() - start
+    runner.close()
+    rate = gens/elapsed
+    return gens, elapsed, rate, rate*N*N
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks and checks the "
+                                     "Game of Life engines in conway.py.")
+    parser.add_argument('--engines', dest='engines',
+                        default=','.join(ALL_ENGINES), required=False)
+    parser.add_argument('--sizes', dest='sizes',
+                        default=','.join(map(str, SIZES)), required=False)
+    parser.add_argument('--densities', dest='densities',
+                        default=','.join(map(str, DENSITIES)), required=False)
+    # time spent on each engine, size and density
+    parser.add_argument('--seconds', dest='seconds', type=float, default=1.0,
+                        required=False)
+    # the per-cell loop takes minutes per generation on large grids
+    parser.add_argument('--loop-max', dest='loopMax', type=int, default=256,
+                        required=False)
+    parser.add_argument('--golden-only', dest='goldenOnly',
+                        action='store_true', required=False)
+    parser.add_argument('--csv', dest='csv', required=False)
+    args = parser.parse_args()
+
+    engines = args.engines.split(',')
+    for engine in engines:
+        if engine not in ALL_ENGINES:
+            parser.error('unknown engine %r, choose from %s' %
+                         (engine, ', '.join(ALL_ENGINES)))
+
+    print('golden suite...')
+    failures = runGolden(engines)
+    if failures:
+        print('%d golden test(s) failed' % len(failures))
+        sys.exit(1)
+    if args.goldenOnly:
+        return
+
+    print('\nbenchmark...')
+    print('%-10s %6s %8s %6s %10s %14s' %
+          ('engine', 'N', 'density', 'gens', 'gens/s', 'cells/s'))
+    rows = []
+    for engine in engines:
+        for N in map(int, args.sizes.split(',')):
+            if engine == 'loop' and N > args.loopMax:
+                continue
+            for density in map(float, args.densities.split(',')):
+                gens, elapsed, rate, cellRate = benchEngine(engine, N, density,
+                                                            args.seconds)
+                print('%-10s %6d %8.2f %6d %10.2f %14.4g' %
+                      (engine, N, density, gens, rate, cellRate))
+                rows.append((engine, N, density, gens, elapsed, rate, cellRate))
+    if args.csv:
+        with open(args.csv, 'w') as f:
+            f.write('engine,N,density,generations,seconds,gens_per_s,cells_per_s\n')
+            for row in rows:
+                f.write('%s,%d,%g,%d,%.6f,%.6g,%.6g\n' % row)
+
+
+# call main
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+conway_export.py
+
+Streams Game of Life frames from conway.py into an animated GIF or a raw
+video file, one frame at a time, without matplotlib.
+"""
+
+# How it works:
+# 1. Each writer owns one frame buffer of 8-bit palette indices, reused for
+#    every frame: cell (i, j) of the grid fills a scale x scale block.
+# 2. GifWriter writes the GIF header and palette once, then for every frame
+#    LZW-compresses the buffer and appends it to the file. Nothing but the
+#    current frame is kept in memory, however long the run.
+# 3. RawVideoWriter appends the buffer as an 8-bit grayscale frame, which
+#    ffmpeg can encode with:
+#    ffmpeg -f rawvideo -pix_fmt gray -s WIDTHxHEIGHT -r 20 -i life.raw life.mp4
+
+import sys, struct
+import numpy as np
+
+# value of an ON cell, as in conway.py
+ON = 255
+
+# GIF colors for OFF and ON cells: the two ends of matplotlib's default
+# viridis colormap, so exported runs look like the imshow window
+PALETTE = [(68, 1, 84), (253, 231, 37)]
+
+
+def lzwEncode(data, minCodeSize):
+    """GIF flavored LZW compression of a bytes-like object of palette indices"""
+    clear = 1 << minCodeSize
+    end = clear + 1
+    out = bytearray()
+    # codes are packed into bytes least significant bit first
+    bits = 0
+    nBits = 0
+    codeSize = minCodeSize + 1
+    # the string table maps (prefix code, next index) to a code
+    table = {}
+    nextCode = end + 1
+
+    # write the clear code so decoders start from a fresh table
+    bits |= clear << nBits
+    nBits += codeSize
+    data = memoryview(data)
+    prefix = data[0]
+    for index in data[1:]:
+        key = (prefix << 8) | index
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        bits |= prefix << nBits
+        nBits += codeSize
+        while nBits >= 8:
+            out.append(bits & 0xff)
+            bits >>= 8
+            nBits -= 8
+        if nextCode < 4096:
+            table[key] = nextCode
+            nextCode += 1
+            # the decoder adds its entries one code later than we do, so
+            # widen the codes one entry past the power of 2
+            if nextCode > (1 << codeSize) and codeSize < 12:
+                codeSize += 1
+        else:
+            # the table is full: tell the decoder to start over
+            bits |= clear << nBits
+            nBits += codeSize
+            table = {}
+            nextCode = end + 1
+            codeSize = minCodeSize + 1
+        prefix = index
+    for code in (prefix, end):
+        bits |= code << nBits
+        nBits += codeSize
+    while nBits > 0:
+        out.append(bits & 0xff)
+        bits >>= 8
+        nBits -= 8
+    return bytes(out)
+
+
+class FrameBuffer:
+    """reused buffer of palette indices for scaled-up grid frames"""
+    def __init__(self, shape, scale=1):
+        self.rows, self.cols = shape
+        self.scale = scale
+        self.height, self.width = self.rows*scale, self.cols*scale
+        self.frame = np.zeros((self.height, self.width), dtype=np.uint8)
+        # the same memory seen as one block of scale x scale pixels per cell
+        self.blocks = self.frame.reshape(self.rows, scale, self.cols, scale)
+
+    def fill(self, grid, on=1):
+        """set the pixels of ON cells to index on and the rest to 0"""
+        alive = (grid == ON)[:, None, :, None]
+        np.multiply(alive, on, out=self.blocks, casting='unsafe')
+        return self.frame
+
+
+class GifWriter:
+    """animated GIF written one frame at a time"""
+    def __init__(self, fileName, shape, scale=1, delay=5, loop=True):
+        self.buffer = FrameBuffer(shape, scale)
+        # delay between frames in hundredths of a second
+        self.delay = delay
+        self.file = open(fileName, 'wb')
+        self.frames = 0
+        width, height = self.buffer.width, self.buffer.height
+        # a 2-color palette padded to the smallest GIF table of 4 colors.
+        # 0x81: global color table of 2^(1+1) entries
+        self.file.write(b'GIF89a' + struct.pack('<HHBBB', width, height,
+                                                 0x81, 0, 0))
+        colors = PALETTE + [(0, 0, 0)]*(4 - len(PALETTE))
+        self.file.write(bytes(c for color in colors for c in color))
+        if loop:
+            # NETSCAPE2.0 extension: loop forever
+            self.file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+    def write(self, grid):
+        """append a 0/255 grid as the next frame"""
+        frame = self.buffer.fill(grid)
+        width, height = self.buffer.width, self.buffer.height
+        # graphic control extension with the frame delay
+        self.file.write(struct.pack('<BBBBHBB', 0x21, 0xf9, 4, 0,
+                                    self.delay, 0, 0))
+        # image descriptor covering the whole screen, no local color table
+        self.file.write(struct.pack('<BHHHHB', 0x2c, 0, 0, width, height, 0))
+        minCodeSize = 2
+        data = lzwEncode(frame.tobytes(), minCodeSize)
+        self.file.write(bytes([minCodeSize]))
+        # image data goes in sub-blocks of at most 255 bytes
+        for i in range(0, len(data), 255):
+            block = data[i:i+255]
+            self.file.write(bytes([len(block)]) + block)
+        self.file.write(b'\x00')
+        self.frames += 1
+
+    def close(self):
+        """write the GIF trailer and close the file"""
+        if self.file is not None:
+            self.file.write(b'\x3b')
+            self.file.close()
+            self.file = None
+
+
+class RawVideoWriter:
+    """raw 8-bit grayscale video frames, written to a file or to stdout ('-')"""
+    def __init__(self, fileName, shape, scale=1):
+        self.buffer = FrameBuffer(shape, scale)
+        if fileName == '-':
+            self.file = sys.stdout.buffer
+            self.ownFile = False
+        else:
+            self.file = open(fileName, 'wb')
+            self.ownFile = True
+        self.frames = 0
+
+    def write(self, grid):
+        """append a 0/255 grid as the next frame"""
+        self.file.write(self.buffer.fill(grid, on=255).data)
+        self.frames += 1
+
+    def close(self):
+        """flush the frames and close the file"""
+        if self.file is not None:
+            self.file.flush()
+            if self.ownFile:
+                self.file.close()
+            self.file = None
+
+
+def openWriter(fileName, shape, scale=1, delay=5):
+    """GIF writer for .gif files, raw video writer for anything else"""
+    if fileName.lower().endswith('.gif'):
+        return GifWriter(fileName, shape, scale, delay)
+    return RawVideoWriter(fileName, shape, scale)
@@ -0,0 +1,260 @@
+"""
+hashlife.py
+
+Bill Gosper's Hashlife algorithm for Conway's Game of Life, used by
+conway.py to jump patterns millions of generations ahead.
+"""
+
+# How it works:
+# 1. The board is a quadtree. A node of level k is a 2^k x 2^k square made
+#    of four level k-1 quadrants (nw, ne, sw, se). Level 0 nodes are cells.
+# 2. Nodes are canonical: every node is built through join(), which looks
+#    the four quadrants up in a hash table, so identical squares anywhere on
+#    the board (and at any time) are the same Python object.
+# 3. The successor of a level k node is its level k-1 center, 2^(k-2)
+#    generations later. It only depends on the node, so it is memoized.
+#    Empty space, still lifes and repeated gliders are computed only once.
+# 4. Both tables are bounded. When the node table has grown past maxNodes,
+#    the next step() first keeps only the nodes the board is made of and
+#    the successors memoized between them, and drops the rest. This only
+#    happens between steps, so one jump never throws away its own working
+#    set, and the table may grow past maxNodes while a jump runs.
+#
+# Unlike update() in conway.py, the Hashlife board is an infinite plane with
+# no toroidal wrap. load() and toArray() copy a window of that plane from
+# and back into the 0/255 NumPy grids used by conway.py.
+
+import numpy as np
+
+# values of the ON and OFF cells, as in conway.py
+ON = 255
+OFF = 0
+
+
+class Node:
+    """canonical quadtree node of a Hashlife board"""
+    __slots__ = ('k', 'nw', 'ne', 'sw', 'se', 'pop')
+
+    def __init__(self, k, nw, ne, sw, se, pop):
+        self.k = k
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        # number of ON cells in the square
+        self.pop = pop
+
+
+# the two level 0 nodes: a single OFF or ON cell
+DEAD = Node(0, None, None, None, None, 0)
+ALIVE = Node(0, None, None, None, None, 1)
+
+
+class Hashlife:
+    """Game of Life board advanced with the Hashlife algorithm"""
+    def __init__(self, maxNodes=1 << 20):
+        """create an empty board with a bounded node cache"""
+        self.maxNodes = maxNodes
+        # canonical nodes, keyed by their four quadrants
+        self.table = {}
+        # memoized successors, keyed by (node, j) for a 2^j generation step
+        self.memo = {}
+        # empty nodes by level
+        self.empties = [DEAD]
+        # the board is centered on the origin: a root of level k covers
+        # rows and columns -2^(k-1) to 2^(k-1) - 1
+        self.root = self.empty(3)
+        self.generation = 0
+        # the window of the last loaded grid, used as toArray's default
+        self.window = (0, 0, 0, 0)
+
+    def join(self, nw, ne, sw, se):
+        """canonical node with the given four quadrants"""
+        key = (nw, ne, sw, se)
+        node = self.table.get(key)
+        if node is None:
+            node = Node(nw.k + 1, nw, ne, sw, se,
+                        nw.pop + ne.pop + sw.pop + se.pop)
+            self.table[key] = node
+        return node
+
+    def evict(self):
+        """drop the nodes and memoized successors the board does not use"""
+        # mark the nodes reachable from the root and the empty nodes
+        keep = set()
+        stack = [self.root] + self.empties
+        while stack:
+            node = stack.pop()
+            if node.k == 0 or id(node) in keep:
+                continue
+            keep.add(id(node))
+            stack.extend((node.nw, node.ne, node.sw, node.se))
+        self.table = {(n.nw, n.ne, n.sw, n.se): n
+                      for n in self.table.values() if id(n) in keep}
+        # a successor is worth keeping if its node and result both are
+        self.memo = {key: result for key, result in self.memo.items()
+                     if id(key[0]) in keep and
+                     (result.k == 0 or id(result) in keep)}
+
+    def empty(self, k):
+        """canonical empty node of level k"""
+        while len(self.empties) <= k:
+            e = self.empties[-1]
+            self.empties.append(self.join(e, e, e, e))
+        return self.empties[k]
+
+    def center(self, node):
+        """level k-1 node at the center of a level k node"""
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def expand(self, node):
+        """level k+1 node with node at its center and empty space around it"""
+        e = self.empty(node.k - 1)
+        return self.join(self.join(e, e, e, node.nw),
+                         self.join(e, e, node.ne, e),
+                         self.join(e, node.sw, e, e),
+                         self.join(node.se, e, e, e))
+
+    def _life4x4(self, node):
+        """level 1 center of a level 2 node after one generation"""
+        # read the 4x4 cells row by row
+        cells = [[0]*4 for i in range(4)]
+        for qi, qj, q in ((0, 0, node.nw), (0, 2, node.ne),
+                          (2, 0, node.sw), (2, 2, node.se)):
+            cells[qi][qj] = q.nw.pop
+            cells[qi][qj+1] = q.ne.pop
+            cells[qi+1][qj] = q.sw.pop
+            cells[qi+1][qj+1] = q.se.pop
+        out = []
+        for i in (1, 2):
+            for j in (1, 2):
+                total = sum(cells[i+di][j+dj] for di in (-1, 0, 1)
+                            for dj in (-1, 0, 1)) - cells[i][j]
+                alive = total == 3 or (cells[i][j] and total == 2)
+                out.append(ALIVE if alive else DEAD)
+        return self.join(*out)
+
+    def successor(self, node, j):
+        """level k-1 center of a level k node, 2^j generations later (j <= k-2)"""
+        if node.pop == 0:
+            return self.empty(node.k - 1)
+        key = (node, j)
+        result = self.memo.get(key)
+        if result is not None:
+            return result
+        if node.k == 2:
+            result = self._life4x4(node)
+        else:
+            # nine overlapping level k-1 squares covering the node
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            n00 = nw
+            n01 = self.join(nw.ne, ne.nw, nw.se, ne.sw)
+            n02 = ne
+            n10 = self.join(nw.sw, nw.se, sw.nw, sw.ne)
+            n11 = self.join(nw.se, ne.sw, sw.ne, se.nw)
+            n12 = self.join(ne.sw, ne.se, se.nw, se.ne)
+            n20 = sw
+            n21 = self.join(sw.ne, se.nw, sw.se, se.sw)
+            n22 = se
+            if j == node.k - 2:
+                # full speed: step each of the nine squares 2^(k-3)
+                # generations, then the four squares they make up another
+                # 2^(k-3), for 2^(k-2) in total
+                step = lambda n: self.successor(n, j - 1)
+                combine = lambda n: self.successor(n, j - 1)
+            else:
+                # slower jump: step the nine squares by 2^j and then only
+                # take the centers of the four squares they make up
+                step = lambda n: self.successor(n, j)
+                combine = self.center
+            r = [step(n) for n in (n00, n01, n02, n10, n11, n12, n20, n21, n22)]
+            result = self.join(combine(self.join(r[0], r[1], r[3], r[4])),
+                               combine(self.join(r[1], r[2], r[4], r[5])),
+                               combine(self.join(r[3], r[4], r[6], r[7])),
+                               combine(self.join(r[4], r[5], r[7], r[8])))
+        self.memo[key] = result
+        return result
+
+    def _fitsCenter(self, node):
+        """True if all ON cells are in the middle half of the node"""
+        inner = self.center(self.center(node))
+        return inner.pop == node.pop
+
+    def step(self, j):
+        """advance the board 2^j generations"""
+        if len(self.table) > self.maxNodes:
+            self.evict()
+        # grow the root until the pattern sits in its inner region, with
+        # room to spread 2^j cells in every direction while it is stepped
+        root = self.root
+        while root.k < j + 3 or not self._fitsCenter(root):
+            root = self.expand(root)
+        self.root = self.successor(root, j)
+        self.generation += 1 << j
+
+    def advance(self, generations):
+        """advance the board any number of generations, a power of 2 at a time"""
+        j = 0
+        while generations:
+            if generations & 1:
+                self.step(j)
+            generations >>= 1
+            j += 1
+
+    def population(self):
+        """number of ON cells"""
+        return self.root.pop
+
+    def _build(self, cells, k):
+        """quadtree for a 2^k x 2^k boolean array"""
+        if not cells.any():
+            return self.empty(k)
+        if k == 0:
+            return ALIVE
+        h = 1 << (k - 1)
+        return self.join(self._build(cells[:h, :h], k - 1),
+                         self._build(cells[:h, h:], k - 1),
+                         self._build(cells[h:, :h], k - 1),
+                         self._build(cells[h:, h:], k - 1))
+
+    def load(self, grid, top=0, left=0):
+        """replace the board with a 0/255 grid whose top left cell is at (top, left)"""
+        rows, cols = grid.shape
+        # smallest root centered on the origin that holds the whole window
+        k = 3
+        half = 1 << (k - 1)
+        while not (-half <= top and top + rows <= half and
+                   -half <= left and left + cols <= half):
+            k += 1
+            half = 1 << (k - 1)
+        cells = np.zeros((2*half, 2*half), dtype=bool)
+        cells[top+half:top+half+rows, left+half:left+half+cols] = grid == ON
+        self.root = self._build(cells, k)
+        self.generation = 0
+        self.window = (top, left, rows, cols)
+
+    def _paint(self, node, y, x, out, top, left):
+        """write the ON cells of node, whose top left is (y, x), into out"""
+        rows, cols = out.shape
+        size = 1 << node.k
+        # skip empty nodes and nodes outside the window
+        if (node.pop == 0 or y >= top + rows or x >= left + cols or
+                y + size <= top or x + size <= left):
+            return
+        if node.k == 0:
+            out[y - top, x - left] = ON
+            return
+        h = size >> 1
+        self._paint(node.nw, y, x, out, top, left)
+        self._paint(node.ne, y, x + h, out, top, left)
+        self._paint(node.sw, y + h, x, out, top, left)
+        self._paint(node.se, y + h, x + h, out, top, left)
+
+    def toArray(self, top=None, left=None, rows=None, cols=None, dtype=np.uint8):
+        """0/255 grid of a window of the board, by default the loaded one"""
+        wTop, wLeft, wRows, wCols = self.window
+        top = wTop if top is None else top
+        left = wLeft if left is None else left
+        rows = wRows if rows is None else rows
+        cols = wCols if cols is None else cols
+        out = np.full((rows, cols), OFF, dtype=dtype)
+        half = 1 << (self.root.k - 1)
+        self._paint(self.root, -half, -half, out, top, left)
+        return out
@@ -7,17 +7,21 @@ in a pentatonic scale
 Author: Katherine Oriol
 """
 
-import matplotlib
 import os
 import time, random
 import wave, argparse
+import multiprocessing, threading
 import numpy as np
-from collections import deque
-from matplotlib import pyplot as plt
-import pyaudio
-# to fix graph display issues on macOS
-matplotlib.use('TkAgg')
+from collections import deque, OrderedDict
+# matplotlib is only imported by initPlot() for --display, so the notes
+# can be generated and streamed on a machine without a display
 
+# PyAudio is only needed to play through a sound card: without it the
+# notes can still be generated, and streamed to the null audio backend
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
 # show plot of algorithm in action?
 gShowPlot = False
 
@@ -27,11 +31,22 @@ pmNotes = {'C4':262, 'Eb':311, 'F':349, 'G':391, 'Bb':466}
 
 CHUNK = 1024
 
-# initialize plotting
-# make a matplotlib figure
-fig, ax = plt.subplots(1)
-# and line plot
-line, = ax.plot([], [])
+# matplotlib figure, axes and line plot, made by initPlot()
+fig, ax, line = None, None, None
+
+
+def initPlot():
+    """make the figure that shows the ring buffer, for --display"""
+    global fig, ax, line
+    import matplotlib
+    # to fix graph display issues on macOS
+    matplotlib.use('TkAgg')
+    from matplotlib import pyplot as plt
+    # make a matplotlib figure
+    fig, ax = plt.subplots(1)
+    # and line plot
+    line, = ax.plot([], [])
+    return plt
 
 
 # write out WAV file
@@ -51,8 +66,8 @@ def writeWAVE(fname, data):
     file.close()
 
 
-def generateNote(freq):
-    """generate note using Karplus-Strong algorithm"""
+def generateNoteLoop(freq):
+    """generate note using Karplus-Strong algorithm, one sample at a time"""
     nSamples = 44100
     sampleRate = 44100
     # rate and speed is 44100 Hz = 1 second long
@@ -91,11 +106,502 @@ def generateNote(freq):
     return samples.tobytes()
 
 
+def ringLength(freq, sampleRate=44100):
+    """length of the Karplus-Strong ring buffer for a note of freq Hz"""
+    # the updates average each value with the next one, so the ring buffer
+    # needs at least two values: above sampleRate/2 there is no note
+    N = int(sampleRate/freq)
+    if N < 2:
+        raise ValueError('%g Hz is above the highest note at %d samples/s, '
+                         '%g Hz' % (freq, sampleRate, sampleRate/2))
+    return N
+
+
+def karplusStrong(buf, nSamples, decay=0.995):
+    """the Karplus-Strong sequence started from ring buffer buf, as an array
+    of nSamples plus at least len(buf) + 1 more values"""
+    # With x[0..N-1] the initial ring buffer, the loop in generateNoteLoop()
+    # plays x[i] and appends x[i+N] = decay*0.5*(x[i] + x[i+1]). Each
+    # block of N new values then only depends on the block before it:
+    #   new[j] = decay*0.5*(old[j] + old[j+1])   for j < N-1
+    #   new[N-1] = decay*0.5*(old[N-1] + new[0])
+    # so a whole ring buffer period is computed with two array operations.
+    # The products and sums are the same as in the loop, in the same
+    # order, so the values are identical, not just close.
+    N = len(buf)
+    if N < 2:
+        raise ValueError('the ring buffer needs at least 2 values, not %d' % N)
+    nBlocks = nSamples//N + 3
+    x = np.empty(nBlocks*N)
+    x[:N] = buf
+    for k in range(1, nBlocks):
+        old = x[(k-1)*N:k*N]
+        new = x[k*N:(k+1)*N]
+        new[:-1] = decay*0.5*(old[:-1] + old[1:])
+        new[-1] = decay*0.5*(old[-1] + new[0])
+    return x
+
+
+def generateNote(freq):
+    """generate note using Karplus-Strong algorithm"""
+    nSamples = 44100
+    sampleRate = 44100
+    # length of Karplus-Strong ring buffer = sample rate / frequency
+    N = ringLength(freq, sampleRate)
+
+    # the same random ring buffer as generateNoteLoop(), so both give the
+    # same note for the same random seed
+    buf = [random.random() - 0.5 for i in range(N)]
+    x = karplusStrong(buf, nSamples)
+    samples = x[:nSamples].astype('float32')
+
+    if gShowPlot:
+        # replay the ring buffer every 1000 samples, as generateNoteLoop()
+        # does while it computes them: after sample i it holds x[i+1:i+N+1]
+        ax.set_xlim([0, N])
+        ax.set_ylim([-1.0, 1.0])
+        line.set_xdata(np.arange(0,N))
+        for i in range(0, nSamples, 1000):
+            line.set_ydata(x[i+1:i+N+1])
+            fig.canvas.draw()
+            fig.canvas.flush_events()
+
+    # samples to 16-bit, max value is 32767
+    samples = np.array(samples * 32767, 'int16')
+    # turn into bytes for WAV file
+    return samples.tobytes()
+
+
+def karplusStrongBank(bufs, nSamples, decays):
+    """nSamples of the Karplus-Strong sequence for each ring buffer in bufs,
+    all advanced together, as the rows of a 2-D array"""
+    # The ring buffers, of different lengths N, are packed into the rows of
+    # one array padded to the longest. Every step advances each row by one
+    # period of its own length, with the same two updates as
+    # karplusStrong(): the padding past a row's end is computed too, but
+    # never read back into the row or written out. Row m's block k holds its
+    # samples k*N to (k+1)*N - 1.
+    M = len(bufs)
+    lengths = np.array([len(b) for b in bufs])
+    if lengths.min() < 2:
+        raise ValueError('the ring buffers need at least 2 values, not %d' %
+                         lengths.min())
+    nMax = lengths.max()
+    rows = np.arange(M)
+    last = lengths - 1
+    # one spare column, so the shifted read old[:, 1:] has nMax columns
+    old = np.zeros((M, nMax + 1))
+    for m, b in enumerate(bufs):
+        old[m, :len(b)] = b
+    new = np.zeros_like(old)
+    factor = np.asarray(decays, dtype=float).reshape(-1, 1)*0.5
+    out = np.empty((M, nSamples))
+    cols = np.arange(nMax)
+    valid = cols < lengths.reshape(-1, 1)
+    rowIndex = np.broadcast_to(rows.reshape(-1, 1), (M, nMax))
+    k = 0
+    while k*lengths.min() < nSamples:
+        # copy out the samples of this block that each row still needs
+        t = k*lengths.reshape(-1, 1) + cols
+        keep = valid & (t < nSamples)
+        out[rowIndex[keep], t[keep]] = old[:, :nMax][keep]
+        # and compute the next one
+        new[:, :nMax] = factor*(old[:, :nMax] + old[:, 1:])
+        new[rows, last] = factor[:, 0]*(old[rows, last] + new[:, 0])
+        old, new = new, old
+        k += 1
+    return out
+
+
+def _synthBank(task):
+    """worker: int16 samples of one bank of ring buffers"""
+    bufs, nSamples, decays = task
+    samples = karplusStrongBank(bufs, nSamples, decays).astype('float32')
+    # samples to 16-bit, as generateNote() does
+    return np.array(samples * 32767, 'int16')
+
+
+def generateNotes(freqs, decays=0.995, nSamples=44100, sampleRate=44100,
+                  workers=None, bankSize=64):
+    """generate many notes at once, returning one int16 array per frequency"""
+    # The ring buffers are drawn from random in the order of freqs, as a
+    # loop of generateNote() calls would draw them, so for the same seed
+    # every note is identical to generateNote()'s. Notes are then sorted
+    # by ring buffer length and cut into banks of bankSize, so that each
+    # bank pads its rows as little as possible; the banks are synthesized
+    # by a pool of worker processes when there is more than one.
+    freqs = np.atleast_1d(freqs)
+    decays = np.broadcast_to(decays, freqs.shape)
+    lengths = [ringLength(f, sampleRate) for f in freqs]
+    bufs = [[random.random() - 0.5 for i in range(N)] for N in lengths]
+    order = np.argsort([len(b) for b in bufs], kind='stable')
+    tasks = []
+    for start in range(0, len(order), bankSize):
+        bank = order[start:start+bankSize]
+        tasks.append(([bufs[m] for m in bank], nSamples, decays[bank]))
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_synthBank, tasks)
+    else:
+        results = [_synthBank(task) for task in tasks]
+    # back to the order of freqs
+    notes = [None]*len(freqs)
+    for start, result in zip(range(0, len(order), bankSize), results):
+        for m, samples in zip(order[start:start+bankSize], result):
+            notes[m] = samples
+    return notes
+
+
+def checkNotes(seed=0):
+    """check generateNote() against generateNoteLoop() for every note"""
+    ok = True
+    for name, freq in pmNotes.items():
+        random.seed(seed)
+        expected = generateNoteLoop(freq)
+        random.seed(seed)
+        if generateNote(freq) != expected:
+            print('generateNote() differs from generateNoteLoop() for ' + name)
+            ok = False
+    # the whole scale at once, with two different banks
+    random.seed(seed)
+    expected = [generateNote(freq) for freq in pmNotes.values()]
+    random.seed(seed)
+    notes = generateNotes(list(pmNotes.values()), workers=1, bankSize=3)
+    if [n.tobytes() for n in notes] != expected:
+        print('generateNotes() differs from generateNote()')
+        ok = False
+    # one note plucked through the streaming synth and the null backend,
+    # consumed as fast as it is made, so with no silence before it
+    random.seed(seed)
+    expected = np.frombuffer(generateNote(pmNotes['C4']), dtype=np.int16)
+    random.seed(seed)
+    synth = StreamSynth(latency=0.1)
+    synth.pluck(pmNotes['C4'])
+    output = NullOutput(synth, realtime=False)
+    synth.start()
+    while synth.busy():
+        time.sleep(0.01)
+    synth.stop()
+    output.close()
+    streamed = output.samples()
+    if not np.array_equal(streamed[:len(expected)], expected):
+        print('StreamSynth differs from generateNote()')
+        ok = False
+    if ok:
+        print('generateNote(), generateNotes() and StreamSynth match '
+              'generateNoteLoop()')
+    return ok
+
+
+class RingBuffer:
+    """lock-free ring buffer of int16 samples, for one writer and one reader"""
+    # The writer only moves self.written and the reader only moves
+    # self.read, and each side moves its own counter after it has copied
+    # the samples, so neither ever sees a half-written block and no lock
+    # is needed between the synth thread and the audio callback.
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        # total samples written and read since the start
+        self.written = 0
+        self.read = 0
+
+    def space(self):
+        """number of samples that can be written without overwriting"""
+        return self.capacity - (self.written - self.read)
+
+    def available(self):
+        """number of samples that can be read"""
+        return self.written - self.read
+
+    def write(self, samples):
+        """write samples, which must fit in space()"""
+        start = self.written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.data[start:start+first] = samples[:first]
+        self.data[:len(samples)-first] = samples[first:]
+        self.written += len(samples)
+
+    def readInto(self, out):
+        """fill out with the next samples and zeros past the available ones,
+        returning the number of samples read"""
+        n = min(len(out), self.available())
+        start = self.read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.data[start:start+first]
+        out[first:n] = self.data[:n-first]
+        out[n:] = 0
+        self.read += n
+        return n
+
+
+class Voice:
+    """one plucked string, generated a block at a time as it is played"""
+    def __init__(self, freq, amplitude=1.0, decay=0.995, nSamples=44100,
+                 sampleRate=44100):
+        N = ringLength(freq, sampleRate)
+        # the same ring buffer and updates as karplusStrong()
+        self.block = np.array([random.random() - 0.5 for i in range(N)])
+        self.next = np.empty_like(self.block)
+        self.decay = decay
+        self.amplitude = amplitude
+        # position in the current block, and samples left to play
+        self.pos = 0
+        self.left = nSamples
+
+    def addTo(self, out):
+        """add the next len(out) samples to out, scaled by the amplitude"""
+        filled = 0
+        n = min(len(out), self.left)
+        N = len(self.block)
+        while filled < n:
+            if self.pos == N:
+                old, new = self.block, self.next
+                new[:-1] = self.decay*0.5*(old[:-1] + old[1:])
+                new[-1] = self.decay*0.5*(old[-1] + new[0])
+                self.block, self.next = new, old
+                self.pos = 0
+            k = min(n - filled, N - self.pos)
+            out[filled:filled+k] += self.amplitude*self.block[self.pos:self.pos+k]
+            self.pos += k
+            filled += k
+        self.left -= n
+        return self.left > 0
+
+
+class StreamSynth:
+    """Karplus-Strong synthesizer that mixes plucked notes as they play"""
+    # pluck() can be called from any thread at any time. A producer thread
+    # mixes the voices that are still sounding, CHUNK samples at a time,
+    # into a RingBuffer a little ahead of the audio backend, which reads
+    # from it in its own callback. Notes overlap, and a note plucked while
+    # another one rings is heard after at most latency seconds.
+    def __init__(self, sampleRate=44100, latency=0.05, chunk=CHUNK):
+        self.sampleRate = sampleRate
+        self.chunk = chunk
+        # room for the latency, and at least two chunks
+        self.ring = RingBuffer(max(int(latency*sampleRate), 2*chunk))
+        # plucks waiting for the producer: deque appends and pops are
+        # atomic, so this needs no lock either
+        self.plucks = deque()
+        self.voices = []
+        self.mix = np.zeros(chunk)
+        self.running = False
+        self.thread = None
+
+    def pluck(self, freq, amplitude=1.0, decay=0.995, seconds=1.0):
+        """start a note; it is mixed with the ones still sounding"""
+        # checked here, where the caller sees the error, and not in the
+        # producer thread that makes the Voice
+        ringLength(freq, self.sampleRate)
+        self.plucks.append((freq, amplitude, decay, int(seconds*self.sampleRate)))
+
+    def render(self):
+        """mix the next chunk of the sounding voices into the ring buffer"""
+        # a pluck leaves the queue only once its voice is sounding, and a
+        # finished voice only once its last samples are in the ring buffer,
+        # so busy() never sees a note in neither place
+        while self.plucks:
+            freq, amplitude, decay, nSamples = self.plucks[0]
+            self.voices.append(Voice(freq, amplitude, decay, nSamples,
+                                     self.sampleRate))
+            self.plucks.popleft()
+        self.mix[:] = 0
+        voices = [v for v in self.voices if v.addTo(self.mix)]
+        # to 16-bit as in generateNote(), clipped where notes add up
+        np.clip(self.mix, -1.0, 32767/32768, out=self.mix)
+        self.ring.write(np.array(self.mix.astype('float32') * 32767, 'int16'))
+        self.voices = voices
+
+    def _produce(self):
+        """producer thread: keep the ring buffer full while notes sound"""
+        # sleep about half a chunk when the buffer is full or nothing
+        # sounds; the backends play silence when the buffer is empty
+        pause = 0.5*self.chunk/self.sampleRate
+        while self.running:
+            if self.ring.space() >= self.chunk and (self.voices or self.plucks):
+                self.render()
+            else:
+                time.sleep(pause)
+
+    def start(self):
+        """start the producer thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self._produce, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stop the producer thread"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def busy(self):
+        """True while notes are sounding or waiting to be played"""
+        return bool(self.voices or self.plucks or self.ring.available())
+
+
+class PyAudioOutput:
+    """plays a StreamSynth through the sound card, from a PyAudio callback"""
+    def __init__(self, synth):
+        if pyaudio is None:
+            raise RuntimeError('PyAudio is not installed, use NullOutput')
+        self.synth = synth
+        self.out = np.zeros(synth.chunk, dtype=np.int16)
+        self.pa = pyaudio.PyAudio()
+        # the callback runs on PortAudio's thread whenever the sound card
+        # wants frameCount more samples
+        self.stream = self.pa.open(format=pyaudio.paInt16, channels=1,
+                                   rate=synth.sampleRate, output=True,
+                                   frames_per_buffer=synth.chunk,
+                                   stream_callback=self.callback)
+
+    def callback(self, inData, frameCount, timeInfo, status):
+        """hand PortAudio the next frameCount samples from the synth"""
+        if len(self.out) != frameCount:
+            self.out = np.zeros(frameCount, dtype=np.int16)
+        # a late producer gives silence, not a stall
+        self.synth.ring.readInto(self.out)
+        return (self.out.tobytes(), pyaudio.paContinue)
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.pa.terminate()
+
+
+class NullOutput:
+    """consumes a StreamSynth like a sound card would, without one"""
+    # A thread reads a chunk from the ring buffer every chunk/sampleRate
+    # seconds and keeps the samples, to be checked or written to a WAV
+    # file. It also counts the underruns, the chunks the producer did not
+    # deliver in time. With realtime=False it reads as fast as the
+    # producer writes instead: it waits for each chunk rather than play
+    # silence, so it keeps exactly the samples the synth made.
+    def __init__(self, synth, realtime=True, keep=True):
+        self.synth = synth
+        self.realtime = realtime
+        self.keep = keep
+        self.chunks = []
+        self.underruns = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._consume, daemon=True)
+        self.thread.start()
+
+    def _consume(self):
+        period = self.synth.chunk/self.synth.sampleRate
+        deadline = time.perf_counter()
+        while self.running:
+            if not self.realtime and self.synth.ring.available() < self.synth.chunk:
+                time.sleep(0.5*period)
+                continue
+            out = np.zeros(self.synth.chunk, dtype=np.int16)
+            # short of samples while voices sound: the producer fell behind
+            if self.synth.ring.readInto(out) < len(out) and self.synth.voices:
+                self.underruns += 1
+            if self.keep:
+                self.chunks.append(out)
+            if self.realtime:
+                deadline += period
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    def samples(self):
+        """all the samples consumed so far"""
+        return np.concatenate(self.chunks) if self.chunks else np.zeros(0, np.int16)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+
+
+def streamTune(synth, notes=None):
+    """pluck random notes of the scale, overlapping, until interrupted or
+    for a number of notes"""
+    played = 0
+    try:
+        while notes is None or played < notes:
+            synth.pluck(random.choice(list(pmNotes.values())))
+            played += 1
+            # rest - 1 to 8 beats; the notes ring on through the rests
+            rest = np.random.choice([1, 2, 4, 8], 1,
+                                    p = [0.15, 0.7, 0.1, 0.05])
+            time.sleep(0.25*rest[0])
+        # let the last notes ring out
+        while synth.busy():
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+
+
+class NoteCache:
+    """decoded WAV files kept in memory, least recently used first out"""
+    # Each file is read once into a bytes object. Playing it hands out
+    # memoryview slices of those bytes, which copy nothing. When the
+    # cached bytes pass maxBytes, the notes played longest ago are dropped
+    # and read again if they are played again.
+    def __init__(self, maxBytes=64*1024*1024):
+        self.maxBytes = maxBytes
+        self.notes = OrderedDict()
+        self.size = 0
+        # modification time of each cached file when it was read
+        self.mtimes = {}
+        # file reads, for checking the cache works
+        self.loads = 0
+
+    def load(self, fileName):
+        """read fileName into the cache, replacing any older copy"""
+        self.drop(fileName)
+        self.mtimes[fileName] = os.path.getmtime(fileName)
+        wf = wave.open(fileName, 'rb')
+        data = wf.readframes(wf.getnframes())
+        frameSize = wf.getsampwidth()*wf.getnchannels()
+        wf.close()
+        self.loads += 1
+        self.notes[fileName] = (memoryview(data), frameSize)
+        self.size += len(data)
+        # evict the least recently used notes, but never the new one
+        while self.size > self.maxBytes and len(self.notes) > 1:
+            self.drop(next(iter(self.notes)))
+        return self.notes[fileName]
+
+    def drop(self, fileName):
+        """remove fileName from the cache, if it is there"""
+        if fileName in self.notes:
+            data, frameSize = self.notes.pop(fileName)
+            self.size -= len(data)
+            del self.mtimes[fileName]
+
+    def refresh(self, fileName):
+        """read fileName unless the cache holds it as it is on disk"""
+        if (fileName in self.notes and
+                self.mtimes[fileName] == os.path.getmtime(fileName)):
+            return self.notes[fileName]
+        return self.load(fileName)
+
+    def get(self, fileName):
+        """memoryview of the frames of fileName and the bytes per frame"""
+        if fileName in self.notes:
+            self.notes.move_to_end(fileName)
+            return self.notes[fileName]
+        return self.load(fileName)
+
+    def chunks(self, fileName, frames=CHUNK):
+        """zero-copy slices of frames frames each of fileName"""
+        data, frameSize = self.get(fileName)
+        step = frames*frameSize
+        return [data[i:i+step] for i in range(0, len(data), step)]
+
+
 # play a WAV file
 class NotePlayer:
     # constructor
-    def __init__(self):
+    def __init__(self, maxCacheBytes=64*1024*1024):
         # init pyaudio object that'll use WAV file
+        if pyaudio is None:
+            raise RuntimeError('playing notes needs PyAudio')
         self.pa = pyaudio.PyAudio()
         # open stream 16-bit single channel
         self.stream = self.pa.open(
@@ -106,13 +612,17 @@ class NotePlayer:
         # dictionary of notes with filenames of 
         # 5 pentatonic note WAV files
         self.notes = []
+        # their decoded frames, so playing a note reads no file
+        self.cache = NoteCache(maxCacheBytes)
 
     # failure to provide a __del__() method for a class causes 
     # problems when objects are repeatedly created and destroyed. 
     # Some system-wide resources, like pyaudio, 
     # may not be cleaned up properly
     def __del__(self):
-        # destructor
+        # destructor, which has nothing to clean up if PyAudio was missing
+        if not hasattr(self, 'stream'):
+            return
         self.stream.stop_stream()
         self.stream.close()
         self.pa.terminate()
@@ -121,25 +631,19 @@ class NotePlayer:
     # class will draw on this list to play a WAV file
     def add(self, fileName):
         self.notes.append(fileName)
+        # decode it now, or again if the file was written since
+        self.cache.refresh(fileName)
 
     # play a note
     def play(self, fileName):
         try:
             print("playing " + fileName)
-            # open WAV file and read 'rb'
-            wf = wave.open(fileName, 'rb')
-            # read a chunk (1024 frames) from file to data
-            data = wf.readframes(CHUNK)
-            # read rest
-            while data != b'':
-                # write the contents of data to PyAudio output
-                # stream aka speaker. Read data in chunks to 
-                # maintain sample rate at output side
+            # write the note from the cache to PyAudio output stream
+            # aka speaker, in chunks of 1024 frames to maintain sample
+            # rate at output side. Each chunk is a slice of the cached
+            # frames, not a copy.
+            for data in self.cache.chunks(fileName):
                 self.stream.write(data)
-                # read the next chunk of data from WAV file
-                data = wf.readframes(CHUNK)
-            # clean up
-            wf.close()
         except BaseException as err:
             print(f"Exception! {err=}, {type(err)=}.\nExiting.")
             exit(0)
@@ -160,11 +664,42 @@ def main():
     # add arguments
     parser.add_argument('--display', action='store_true', required=False)
     parser.add_argument('--play', action='store_true', required=False)
+    # play a random tune with overlapping notes from the streaming synth;
+    # --null-audio streams to no sound card, and --record saves what it got
+    parser.add_argument('--stream', action='store_true', required=False)
+    parser.add_argument('--null-audio', dest='nullAudio', action='store_true',
+                        required=False)
+    parser.add_argument('--record', dest='record', required=False)
+    parser.add_argument('--notes', dest='notes', type=int, required=False)
+    # check the vectorized synthesis against the loop and exit
+    parser.add_argument('--check', action='store_true', required=False)
     args = parser.parse_args()
 
+    if args.check:
+        raise SystemExit(0 if checkNotes() else 1)
+
+    if args.stream:
+        if pyaudio is None and not (args.nullAudio or args.record):
+            parser.error('--stream needs PyAudio, or use --null-audio')
+        synth = StreamSynth()
+        synth.start()
+        if args.nullAudio or args.record:
+            output = NullOutput(synth, keep=bool(args.record))
+        else:
+            output = PyAudioOutput(synth)
+        streamTune(synth, args.notes)
+        synth.stop()
+        output.close()
+        if args.record:
+            writeWAVE(args.record, output.samples().tobytes())
+        if isinstance(output, NullOutput):
+            print('%d underruns' % output.underruns)
+        return
+
     # show plot if flag set
     if args.display:
         gShowPlot = True
+        plt = initPlot()
         # plt.ion()
         plt.show(block=False)
 
@@ -172,9 +707,17 @@ def main():
     nplayer = NotePlayer()
 
     print('creating notes...')
+    # without the display, synthesize the missing notes all at once
+    missing = [name for name in pmNotes
+               if not os.path.exists(name + '.wav') and not args.display]
+    batch = dict(zip(missing, generateNotes([pmNotes[name] for name in missing],
+                                            workers=1)))
     for name, freq in list(pmNotes.items()):
         fileName = name + '.wav'
-        if not os.path.exists(fileName) or args.display:
+        if name in batch:
+            print('creating ' + fileName + '...')
+            writeWAVE(fileName, batch[name])
+        elif not os.path.exists(fileName) or args.display:
             data = generateNote(freq)
             print('creating ' + fileName + '...')
             writeWAVE(fileName, data)